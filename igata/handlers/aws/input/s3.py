@@ -2,13 +2,11 @@ import csv
 import datetime
 import logging
 import os
-from multiprocessing.pool import ThreadPool
 from typing import Generator, List, Tuple, Union
 
 import numpy as np
 
-from .... import settings
-from ....utils import parse_s3_uri, prepare_csv_reader, prepare_images
+from ....utils import download_starmap, parse_s3_uri, prepare_csv_reader, prepare_images
 from . import InputCtxManagerBase
 
 logger = logging.getLogger("cliexecutor")
@@ -43,8 +41,7 @@ class S3BucketImageInputCtxManager(InputCtxManagerBase):
                 logger.info(f"parser_s3_uri() key: {key}")
                 args.append((bucket, key))
 
-            pool = ThreadPool(settings.DOWNLOAD_WORKERS)
-            for (bucket, key), image, download_time, error_message in pool.starmap(prepare_images, args):
+            for (bucket, key), image, download_time, error_message in download_starmap(prepare_images, args):
                 info = {}
                 if error_message:
                     # add error message to request in order to return info to user
@@ -101,8 +98,7 @@ class S3BucketCSVInputCtxManager(InputCtxManagerBase):
                 logger.info(f"parser_s3_uri() key: {key}")
                 args.append((bucket, key, self.reader))
 
-            pool = ThreadPool(settings.DOWNLOAD_WORKERS)
-            for (bucket, key), csvreader, download_time, error_message in pool.starmap(prepare_csv_reader, args):
+            for (bucket, key), csvreader, download_time, error_message in download_starmap(prepare_csv_reader, args):
                 info = {}
                 if error_message:
                     # add error message to request in order to return info to user
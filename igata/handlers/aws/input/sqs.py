@@ -2,21 +2,17 @@ import json
 import logging
 import time
 from collections.abc import Iterable
-from multiprocessing.pool import ThreadPool
 from typing import Dict, Generator, Tuple, Union
 
-import boto3
 import numpy as np
 import pandas
 
 from .... import settings
-from ....utils import parse_s3_uri, prepare_csv_dataframe, prepare_images, s3_key_exists
+from ....utils import download_starmap, get_sqs_resource, parse_s3_uri, prepare_csv_dataframe, prepare_images, s3_key_exists
 from . import InputCtxManagerBase
 
 logger = logging.getLogger("cliexecutor")
 
-SQS = boto3.resource("sqs", endpoint_url=settings.SQS_ENDPOINT, region_name=settings.AWS_REGION)
-
 
 class SQSMessageS3InputImageCtxManager(InputCtxManagerBase):
     """get_records() is called by results will use `put_records()` to output to the envar defined SQS Queue"""
@@ -53,7 +49,7 @@ class SQSMessageS3InputImageCtxManager(InputCtxManagerBase):
             If a single message causes the len() > MAX_PROCESSING_REQUESTS, all requests in the message will be processed/included.
 
         """
-        queue = SQS.Queue(url=self.sqs_queue_url)
+        queue = get_sqs_resource().Queue(url=self.sqs_queue_url)
         all_processing_requests: Union[list, dict] = []  # SQS messages (should be a *list*, may be given an single dict)
 
         estimated_visibility_timeout = self.max_processing_requests * settings.MAX_PER_REQUEST_PROCESSING_SECONDS
@@ -95,29 +91,34 @@ class SQSMessageS3InputImageCtxManager(InputCtxManagerBase):
                 logger.warning(f"SQS MessageBody not list!!! Putting object in list: {all_processing_requests}")
                 all_processing_requests = [all_processing_requests]
 
+            request_s3uri_keys = []
+            args = []
             for request in all_processing_requests:
-                logger.info(f"Processing request: {request}")
                 for s3uri_key in self.s3uri_keys:
-                    s3uri = request[s3uri_key]
-                    logger.debug(f"s3uri: {s3uri}")
-                    bucket, key = parse_s3_uri(s3uri)
+                    request_s3uri_keys.append((request, s3uri_key))
+                    args.append(parse_s3_uri(request[s3uri_key]))
 
-                    (bucket, key), image, download_time, error_message = prepare_images(bucket, key)
-                    if error_message:
-                        logger.error(f"error_message returned from prepare_images(): {error_message}")
-                        # add error message to request in order to return info to user
-                        if "errors" not in request:
-                            request["errors"] = [error_message]
-                        else:
-                            if not request["errors"]:
-                                request["errors"] = []
-                            request["errors"].append(error_message)
-                        logger.error(error_message)
-
-                    info = {"bucket": bucket, "key": key, "download_time": download_time, "current_s3uri_key": s3uri_key}
-                    logger.debug(f"Adding request attributes to info: {request}")
-                    info.update(request)  # add request info to returned info
-                    yield image, info
+            # images are downloaded concurrently, and processed in request order
+            for (request, s3uri_key), ((bucket, key), image, download_time, error_message) in zip(
+                request_s3uri_keys, download_starmap(prepare_images, args)
+            ):
+                logger.info(f"Processing request: {request}")
+                logger.debug(f"s3uri: {request[s3uri_key]}")
+                if error_message:
+                    logger.error(f"error_message returned from prepare_images(): {error_message}")
+                    # add error message to request in order to return info to user
+                    if "errors" not in request:
+                        request["errors"] = [error_message]
+                    else:
+                        if not request["errors"]:
+                            request["errors"] = []
+                        request["errors"].append(error_message)
+                    logger.error(error_message)
+
+                info = {"bucket": bucket, "key": key, "download_time": download_time, "current_s3uri_key": s3uri_key}
+                logger.debug(f"Adding request attributes to info: {request}")
+                info.update(request)  # add request info to returned info
+                yield image, info
 
     def __enter__(self):
         return self
@@ -177,7 +178,7 @@ class SQSMessageS3InputCSVPandasDataFrameCtxManager(InputCtxManagerBase):
 
     def _get_processing_requests(self) -> Union[list, dict]:
         """Collect processing requests from SQS Queue"""
-        queue = SQS.Queue(url=self.sqs_queue_url)
+        queue = get_sqs_resource().Queue(url=self.sqs_queue_url)
         processing_requests: Union[list, dict] = []  # SQS messages (should be a *list*, may be given an single dict)
 
         estimated_visibility_timeout = self.max_processing_requests * settings.MAX_PER_REQUEST_PROCESSING_SECONDS
@@ -258,9 +259,7 @@ class SQSMessageS3InputCSVPandasDataFrameCtxManager(InputCtxManagerBase):
 
                 if info["is_valid"]:
                     download_start = time.time()
-                    pool = ThreadPool(settings.DOWNLOAD_WORKERS)
-
-                    for (bucket, key), df, _, error_message in pool.starmap(prepare_csv_dataframe, args):
+                    for (bucket, key), df, _, error_message in download_starmap(prepare_csv_dataframe, args):
                         filename = key.split("/")[-1]
                         logger.debug(f"filename={filename}")
                         dataframe_key = f"{filename}__dataframe"
@@ -1,25 +1,20 @@
-import datetime
-import json
 import logging
 import time
-from concurrent.futures import ThreadPoolExecutor
-from decimal import Decimal
+from concurrent.futures import wait
 from hashlib import md5
-from typing import Generator, List, Tuple
+from typing import List, Tuple
 
-import boto3
-from botocore.config import Config
+from boto3.dynamodb.table import BatchWriter
 
 from .... import settings
-from ....utils import flatten
+from ....utils import flatten, get_dynamodb_client, get_dynamodb_table
 from . import OutputCtxManagerBase
+from .utils import BoundedThreadPoolExecutor, DecimalTypeSerializer, drain_completed_futures, prepare_record, wait_for_futures
 
 logger = logging.getLogger("cliexecutor")
 
-
-TEN_SECONDS = 10
-config = Config(connect_timeout=TEN_SECONDS, retries={"max_attempts": 5})
-DYNAMODB = boto3.resource("dynamodb", config=config, region_name=settings.AWS_REGION, endpoint_url=settings.DYNAMODB_ENDPOINT)
+# detailed results are written with the low-level client, items are serialized with DecimalTypeSerializer before being sent
+SERIALIZER = DecimalTypeSerializer()
 
 
 class ResultExpectedKeyError(KeyError):
@@ -28,11 +23,38 @@ class ResultExpectedKeyError(KeyError):
     pass
 
 
-def get_nested_keys(record: dict) -> Generator[str, None, None]:
-    """get all keys in a dictionary that contains nested mappings/elements"""
-    for k, v in record.items():
-        if isinstance(v, (list, tuple, dict)):
-            yield k
+def flatten_and_convert(result: dict) -> Tuple[List[tuple], dict]:
+    """
+    Flatten the given result in a single pass, returning both:
+    flattened_pairs: the flattened (key, value) pairs of the original values (used to generate the item hashkey)
+    output_item: the flattened item with values serialized to DynamoDB AttributeValues (float values converted to Decimal)
+    """
+    flattened_pairs = []
+    output_item = {}
+    serialize = SERIALIZER.serialize
+    for key, value in flatten(result, allow_null_strings=False):
+        flattened_pairs.append((key, value))
+        output_item[key] = serialize(value)
+    return flattened_pairs, output_item
+
+
+def generate_result_hashkey(flattened_pairs: List[tuple]) -> str:
+    """
+    Generate the unique detailed result hashkey from the flattened (key, value) pairs
+
+    .. note::
+
+        The hashed value *MUST* remain `str(sorted(flattened_pairs))` in order for existing hashkeys to be reproduced.
+    """
+    return md5(str(sorted(flattened_pairs)).encode("utf8")).hexdigest()
+
+
+def put_detailed_results(tablename: str, items: List[dict]) -> int:
+    """Write the given (serialized) detailed result items with BatchWriteItem requests, returning the number of items written"""
+    with BatchWriter(tablename, get_dynamodb_client()) as detailed_writer:
+        for item in items:
+            detailed_writer.put_item(item)
+    return len(items)
 
 
 def update_item(
@@ -50,21 +72,23 @@ def update_item(
     - REQUESTS_TABLE_RESULTS_KEYNAME
     - RESULTS_TABLE_STATE_FIELDNAME
     """
-    table = DYNAMODB.Table(tablename)
+    table = get_dynamodb_table(tablename)
     logger.info(f"Updating item in Table({tablename})...")
     logger.debug(f"item: {item}")
-    utc_timestamp = datetime.datetime.now(datetime.timezone.utc).timestamp()
     # update None to empty list for results
-    if item[settings.DYNAMODB_REQUESTS_TABLE_RESULTS_KEYNAME] is None:
+    if item[requests_results_key] is None:
         msg = f"item[REQUESTS_TABLE_RESULTS_KEYNAME] is None, " f'setting REQUESTS_TABLE_RESULTS_KEYNAME({item[requests_results_key]}) to "[]"'
         logger.warning(msg)
-        item[settings.DYNAMODB_REQUESTS_TABLE_RESULTS_KEYNAME] = "[]"  # to resolve issue with read from Pynamodb
+        item[requests_results_key] = "[]"  # to resolve issue with read from Pynamodb
 
     try:
         # Assure that updated `errors` field is not None
-        errors_field_value = "[]"
-        if "errors" in item and item["errors"] is not None:
-            errors_field_value = item["errors"]
+        errors_field_value = item.get("errors")
+        if errors_field_value is None:
+            errors_field_value = "[]"
+        updated_at_timestamp = item.get("updated_at_timestamp")
+        if updated_at_timestamp is None:
+            updated_at_timestamp = int(time.time())  # UTC epoch seconds
         response = table.update_item(
             Key={requests_hashkey: item[requests_hashkey]},
             UpdateExpression=(
@@ -75,7 +99,7 @@ def update_item(
                 ":state": item[results_state_key],
                 f":{requests_results_key}": item[requests_results_key],
                 ":errors": errors_field_value,
-                ":updated_at_timestamp": item.get("updated_at_timestamp", int(utc_timestamp)),
+                ":updated_at_timestamp": updated_at_timestamp,
             },
         )
     except Exception as e:
@@ -86,35 +110,6 @@ def update_item(
     return response
 
 
-def check_and_convert(value, precision=settings.DYNAMODB_DECIMAL_PRECISION_DIGITS):
-    """convert float to decimal for dynamodb"""
-    return value if not isinstance(value, float) else round(Decimal(value), precision)
-
-
-def prepare_record(record: dict) -> Tuple[dict, dict]:
-    """
-    Convert record data for DynamoDB insertion
-    record: updated record with json dumps fields for nested record values
-    original_nested_data: untouched nested key record data
-    """
-    original_nested_data = {}  # used for processing the results into the results table
-    nested_keys = get_nested_keys(record)
-    if not nested_keys:
-        logger.warning(f"No nested_keys found for record: {record}")
-    else:
-        for nested_key in nested_keys:
-            # jsonize and byteify nested items
-            value = record[nested_key]
-            original_nested_data[nested_key] = value  # keep original value for later processing
-            value_json_bytes = json.dumps(value)
-            record[nested_key] = value_json_bytes
-    non_nested_keys = set(record.keys()) - set(nested_keys)
-    for k in non_nested_keys:
-        v = record[k]
-        record[k] = check_and_convert(v)
-    return record, original_nested_data
-
-
 class DynamodbOutputCtxManager(OutputCtxManagerBase):
     """Output records to dynamodb"""
 
@@ -130,8 +125,7 @@ class DynamodbOutputCtxManager(OutputCtxManagerBase):
         self.requests_hashkey = kwargs.get("requests_hashkey", "request_id")
         self.requests_statekey = kwargs.get("requests_statekey", "state")
         self.results_keyname = settings.DYNAMODB_REQUESTS_TABLE_RESULTS_KEYNAME
-        self.executor = ThreadPoolExecutor()
-        self.futures = []
+        self.executor = BoundedThreadPoolExecutor(max_workers=settings.DYNAMODB_WRITER_THREADS)
         self.results_additional_parent_keys = kwargs.get("results_additional_parent_keys", None)
         if not self.results_additional_parent_keys:
             if settings.DYNAMODB_RESULTS_ADDITIONAL_PARENT_FIELDS:
@@ -151,22 +145,28 @@ class DynamodbOutputCtxManager(OutputCtxManagerBase):
            - Detailed results table
                - for analyzing the detailed results for a specific request
         """
-        detailed_results_table = DYNAMODB.Table(self.results_tablename)
+        if not records:
+            logger.debug("put_records(): no records given, skipping")
+            return {"request_update_items": 0, "detailed_results_put_items": 0, "total_results": 0, "elapsed": 0.0}
 
         start = time.time()
         request_update_items = 0
         detailed_results_put_items = 0
         total_results = 0
+        futures = []
 
         # create local references for minor speedup
         DYNAMODB_RESULTS_PROCESSED_STATE = settings.DYNAMODB_RESULTS_PROCESSED_STATE
         DYNAMODB_RESULTS_ERROR_STATE = settings.DYNAMODB_RESULTS_ERROR_STATE
 
         DYNAMODB_RESULTS_SORTKEY_KEYNAME = settings.DYNAMODB_RESULTS_SORTKEY_KEYNAME
+        DYNAMODB_DETAILED_RESULTS_FLUSH_ITEMS = settings.DYNAMODB_DETAILED_RESULTS_FLUSH_ITEMS
 
         logger.debug(f"DYNAMODB_RESULTS_PROCESSED_STATE: {DYNAMODB_RESULTS_PROCESSED_STATE}")
         logger.debug(f"DYNAMODB_REQUESTS_TABLE_RESULTS_KEYNAME: {self.results_keyname}")
-        with detailed_results_table.batch_writer() as detailed_writer:
+        detailed_items = []
+        detailed_futures = []
+        try:
             for record in records:
                 # update record with state, so it is included in the resulting nested_keys
                 state = DYNAMODB_RESULTS_PROCESSED_STATE
@@ -183,8 +183,9 @@ class DynamodbOutputCtxManager(OutputCtxManagerBase):
                 future = self.executor.submit(
                     update_item, prepared_record, self.requests_tablename, self.requests_hashkey, self.results_keyname, self.requests_statekey
                 )
-                self.futures.append(future)
+                futures.append(future)
                 request_update_items += 1
+                futures = drain_completed_futures(futures)
 
                 # output to detailed table
                 if self.results_keyname not in original_record_nested_data:
@@ -210,18 +211,29 @@ class DynamodbOutputCtxManager(OutputCtxManagerBase):
 
                                 result[additional_key] = prepared_record[additional_key]
 
-                        flattened_result = tuple(flatten(result, allow_null_strings=False))
-                        # dynamodb doesn't support Float types are not supported. Use Decimal types instead.
-                        output_item = {k: check_and_convert(v) for k, v in flattened_result}
+                        flattened_result, output_item = flatten_and_convert(result)
 
                         if DYNAMODB_RESULTS_SORTKEY_KEYNAME not in output_item:  # make sure that required sortkey is included
                             raise ValueError(f"Expected SortKey({DYNAMODB_RESULTS_SORTKEY_KEYNAME} not in: {output_item}")
 
                         # generate unique hashkey
-                        output_item["hashkey"] = md5(str(sorted(flattened_result)).encode("utf8")).hexdigest()
-                        logger.debug(f"detailed_writer.put_item: {output_item}")
-                        detailed_writer.put_item(output_item)
+                        output_item["hashkey"] = {"S": generate_result_hashkey(flattened_result)}
+                        logger.debug(f"detailed_items.append: {output_item}")
+                        detailed_items.append(output_item)
                         detailed_results_put_items += 1
+                        if len(detailed_items) >= DYNAMODB_DETAILED_RESULTS_FLUSH_ITEMS:
+                            # write detailed results concurrently with the submitted update_item() calls
+                            detailed_futures.append(self.executor.submit(put_detailed_results, self.results_tablename, detailed_items))
+                            detailed_items = []
+        finally:
+            # make sure that already prepared detailed results are written and submitted update_item() calls complete,
+            # even if an invalid record raised an exception
+            if detailed_items:
+                detailed_futures.append(self.executor.submit(put_detailed_results, self.results_tablename, detailed_items))
+            wait_for_futures(futures)
+            wait(detailed_futures)
+        for detailed_future in detailed_futures:
+            detailed_future.result()  # raise any detailed results write exception
 
         end = time.time()
         summary = {
@@ -241,18 +253,6 @@ class DynamodbOutputCtxManager(OutputCtxManagerBase):
         if self._record_results:
             logger.debug(f"put_records(): {len(self._record_results)}")
             self.put_records(self._record_results)
-
-        for f in self.futures:
-            response = f.result(timeout=None)
-            logger.debug(f"future response: {response}")
-            if response and "ResponseMetadata" in response and "HTTPStatusCode" in response["ResponseMetadata"]:
-                status_code = response["ResponseMetadata"]["HTTPStatusCode"]
-                if status_code != 200:
-                    logger.error(f"(update_item) future response: [{status_code}] {response}")
-                else:
-                    logger.info(f"(update_item) future response: [{status_code}]")
-            else:
-                logger.warning(f"future UNKNOWN response: {response}")
         self.executor.shutdown()
 
     @classmethod
@@ -1,8 +1,10 @@
 import logging
 import os
+from collections import defaultdict
 from typing import List
 
 import psycopg2
+from psycopg2.extras import execute_values
 
 from . import OutputCtxManagerBase
 
@@ -14,6 +16,8 @@ DB_HOST = os.getenv("DB_HOST", None)
 DB_PORT = os.getenv("DB_PORT", 5432)
 DB_USER = os.getenv("DB_USER", None)
 DB_PASSWORD = os.getenv("DB_PASSWORD", None)
+# number of rows included in a single multi-row INSERT statement
+DB_INSERT_PAGE_SIZE = int(os.getenv("DB_INSERT_PAGE_SIZE", 1000))
 DATABASE_CONFIGURATION = {"dbname": DB_NAME, "dbhost": DB_HOST, "dbport": DB_PORT, "dbuser": DB_USER, "dbpass": DB_PASSWORD}
 
 
@@ -49,22 +53,21 @@ class PostgresqlRdsOutputCtxManager(OutputCtxManagerBase):
     def put_records(self, records: List[dict]) -> bool:
         """
         Build INSERT statement.
+        Records are grouped by fieldnames and each group is inserted with multi-row INSERT statement(s).
         Data committed on exit of context manager.
         """
+        grouped_rows = defaultdict(list)
         for record in records:
-            # build SQL
-            fieldnames = []
-            fieldvalues = []
-            for fieldname, fieldvalue in record.items():
-                fieldnames.append(fieldname)
-                fieldvalues.append(fieldvalue)
+            fieldnames = tuple(record.keys())
+            grouped_rows[fieldnames].append(tuple(record.values()))
 
+        for fieldnames, rows in grouped_rows.items():
+            # build SQL
             fields_str = ", ".join(fieldnames)
-            dummy_fields_str = ", ".join(["%s"] * len(fieldvalues))
-            sql = f"INSERT INFO {self.tablename} ({fields_str}) VALUES({dummy_fields_str})"
+            sql = f"INSERT INTO {self.tablename} ({fields_str}) VALUES %s"
 
-            self.cursor.execute(sql, fieldvalues)
-            self._output_rows += 1
+            execute_values(self.cursor, sql, rows, page_size=DB_INSERT_PAGE_SIZE)
+            self._output_rows += len(rows)
         return True
 
     def __enter__(self):
@@ -1,15 +1,49 @@
-import json
 import logging
+import os
+import time
 from collections import Counter
-from typing import Union
+from concurrent.futures import as_completed
+from typing import Iterable, Iterator, List, Tuple, Union
 
-import boto3
-
-from .... import settings
+from ....utils import get_sqs_client, json_dumps
 from . import OutputCtxManagerBase
+from .utils import BoundedThreadPoolExecutor
 
 logger = logging.getLogger("cliexecutor")
-SQS = boto3.client("sqs", endpoint_url=settings.SQS_ENDPOINT, region_name="ap-northeast-1")
+# output queue region (the queue is identified by sqs_queue_url)
+SQS_OUTPUT_REGION_NAME = "ap-northeast-1"
+
+# maximum number of entries accepted by a single SQS send_message_batch() call
+SQS_SEND_MESSAGE_BATCH_MAX_ENTRIES = 10
+# maximum total payload of a single send_message_batch() call (same as the single message limit)
+SQS_SEND_MESSAGE_BATCH_MAX_BYTES = int(os.getenv("SQS_SEND_MESSAGE_BATCH_MAX_BYTES", str(256 * 1024)))
+SQS_SEND_MESSAGE_BATCH_MAX_RETRIES = int(os.getenv("SQS_SEND_MESSAGE_BATCH_MAX_RETRIES", "3"))
+SQS_SEND_MESSAGE_BATCH_RETRY_BACKOFF_SECONDS = float(os.getenv("SQS_SEND_MESSAGE_BATCH_RETRY_BACKOFF_SECONDS", "0.1"))
+# number of send_message_batch() calls performed concurrently
+SQS_SEND_MESSAGE_BATCH_WORKERS = int(os.getenv("SQS_SEND_MESSAGE_BATCH_WORKERS", "8"))
+
+
+def batch_entries(records: Iterable, prepare_message_body) -> Iterator[List[dict]]:
+    """
+    Yield send_message_batch() entries for the given records
+
+    Batches are limited to both SQS_SEND_MESSAGE_BATCH_MAX_ENTRIES entries and SQS_SEND_MESSAGE_BATCH_MAX_BYTES total message body bytes.
+    prepare_message_body: callable returning the (message_body, message_body_utf8_bytes) of a record
+    """
+    entries = []
+    batch_bytes = 0
+    for record in records:
+        message_body, message_body_utf8_bytes = prepare_message_body(record)
+        if entries and (
+            len(entries) >= SQS_SEND_MESSAGE_BATCH_MAX_ENTRIES or batch_bytes + message_body_utf8_bytes > SQS_SEND_MESSAGE_BATCH_MAX_BYTES
+        ):
+            yield entries
+            entries = []
+            batch_bytes = 0
+        entries.append({"Id": str(len(entries)), "MessageBody": message_body})
+        batch_bytes += message_body_utf8_bytes
+    if entries:
+        yield entries
 
 
 class SQSRecordOutputCtxManager(OutputCtxManagerBase):
@@ -19,6 +53,7 @@ class SQSRecordOutputCtxManager(OutputCtxManagerBase):
         super().__init__(*args, **kwargs)
         self.sqs_queue_url = kwargs.get("sqs_queue_url", None)
         assert self.sqs_queue_url.startswith("http")
+        self.executor = BoundedThreadPoolExecutor(max_workers=SQS_SEND_MESSAGE_BATCH_WORKERS)
 
     @classmethod
     def required_kwargs(cls) -> tuple:
@@ -42,17 +77,56 @@ class SQSRecordOutputCtxManager(OutputCtxManagerBase):
 
         """
         summary = Counter()
+        futures = []
+        for entries in batch_entries(records, self.prepare_message_body):
+            futures.append(self.executor.submit(self.send_message_batch, entries))
+        for future in as_completed(futures):
+            summary.update(future.result())
+        return summary
+
+    @staticmethod
+    def prepare_message_body(record: dict) -> Tuple[str, int]:
+        """Serialize the given record, returning the (message_body, message_body_utf8_bytes)"""
         max_sqs_message_body_bytes = 2048
-        for record in records:
-            message_body_json = json.dumps(record)
-            message_body_utf8_bytes = len(message_body_json.encode("utf8"))
-            logger.info(f"Message Bytes={message_body_utf8_bytes}")
-            if message_body_utf8_bytes > max_sqs_message_body_bytes:
-                logger.error(f"message_body_utf8_bytes({message_body_utf8_bytes}) > max_sqs_message_body_bytes({max_sqs_message_body_bytes})")
-            logger.debug(f"Queuing({self.sqs_queue_url}): {record}")
-            response = SQS.send_message(QueueUrl=self.sqs_queue_url, MessageBody=message_body_json)
+        message_body_json = json_dumps(record)
+        message_body_utf8_bytes = len(message_body_json.encode("utf8"))
+        logger.debug(f"Message Bytes={message_body_utf8_bytes}")
+        if message_body_utf8_bytes > max_sqs_message_body_bytes:
+            logger.error(f"message_body_utf8_bytes({message_body_utf8_bytes}) > max_sqs_message_body_bytes({max_sqs_message_body_bytes})")
+        return message_body_json, message_body_utf8_bytes
+
+    def send_message_batch(self, entries: List[dict]) -> Counter:
+        """
+        Send the given entries (see `batch_entries()`) with a single send_message_batch() call
+
+        Entries that fail because of a server side error are retried with exponential backoff,
+        entries rejected because of a sender fault are not retried.
+        """
+        summary = Counter()
+        attempt = 0
+        while entries:
+            logger.debug(f"Queuing({self.sqs_queue_url}): {len(entries)} messages")
+            response = get_sqs_client(SQS_OUTPUT_REGION_NAME).send_message_batch(QueueUrl=self.sqs_queue_url, Entries=entries)
             logger.debug(f"response: {response}")
-            summary["sent_messages"] += 1
+            summary["sent_messages"] += len(response.get("Successful", []))
+
+            retry_ids = set()
+            for failed in response.get("Failed", []):
+                if failed.get("SenderFault", False):
+                    logger.error(f"send_message_batch() entry rejected: {failed}")
+                    summary["failed_messages"] += 1
+                else:
+                    retry_ids.add(failed["Id"])
+            entries = [entry for entry in entries if entry["Id"] in retry_ids]
+            if entries:
+                if attempt >= SQS_SEND_MESSAGE_BATCH_MAX_RETRIES:
+                    logger.error(f"send_message_batch() retries exhausted, failed entries: {len(entries)}")
+                    summary["failed_messages"] += len(entries)
+                    break
+                backoff_seconds = SQS_SEND_MESSAGE_BATCH_RETRY_BACKOFF_SECONDS * (2**attempt)
+                logger.warning(f"send_message_batch() failed entries: {len(entries)}, retrying in {backoff_seconds}s")
+                time.sleep(backoff_seconds)
+                attempt += 1
         return summary
 
     def __enter__(self):
@@ -64,3 +138,4 @@ class SQSRecordOutputCtxManager(OutputCtxManagerBase):
         if self._record_results:
             logger.debug(f"put_records(): {len(self._record_results)}")
             self.put_records(self._record_results)
+        self.executor.shutdown()
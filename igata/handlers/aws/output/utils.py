@@ -1,79 +1,217 @@
-import datetime
-import json
 import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from decimal import Decimal
-from typing import Generator, Tuple
+from functools import lru_cache
+from threading import BoundedSemaphore
+from typing import List, Tuple
 
-import boto3
-from botocore.config import Config
+from boto3.dynamodb.types import TypeSerializer
 from igata import settings
+from igata.utils import json_dumps
 
 logger = logging.getLogger("cliexecutor")
 
+REQUESTS_TABLE_HASHKEY_KEYNAME = settings.DYNAMODB_REQUESTS_TABLE_HASHKEY_KEYNAME
+RESULTS_TABLE_STATE_FIELDNAME = settings.DYNAMODB_RESULTS_TABLE_STATE_FIELDNAME
 
-TEN_SECONDS = 10
-config = Config(connect_timeout=TEN_SECONDS, retries={"max_attempts": 5})
-DYNAMODB = boto3.resource("dynamodb", config=config, region_name=settings.AWS_REGION, endpoint_url=settings.DYNAMODB_ENDPOINT)
+# update_item() expression values are constant, define once and share between calls
+# NOTE: botocore requires a `dict` instance for ExpressionAttributeNames and does not modify the given value
+UPDATE_ITEM_EXPRESSION = (
+    # should be REQUESTS_TABLE_RESULTS_KEYNAME
+    "SET #s = :predictor_status, #r = :result_s3_uris, #e = :errors, #u = :updated_timestamp, #c = :completed_timestamp"
+)
+UPDATE_ITEM_EXPRESSION_ATTRIBUTE_NAMES = {
+    "#s": "predictor_status",  # settings.DYNAMODB_RESULTS_TABLE_STATE_FIELDNAME,
+    "#u": "updated_timestamp",  # settings.DYNAMODB_REQUESTS_TABLE_RESULTS_KEYNAME,
+    "#c": "completed_timestamp",
+    "#r": "result_s3_uris",
+    "#e": "errors",
+}
 
+# exact types of values that are never converted by prepare_record(), checked with a set lookup before the isinstance() checks
+# --> subclasses (ex: numpy.float64) are not in the set and still pass through the isinstance() checks
+UNCONVERTED_VALUE_TYPES = frozenset({str, int, bool, type(None), Decimal})
+NESTED_VALUE_TYPES = (list, tuple, dict)
 
-def update_item(item: dict, tablename: str) -> dict:
+# format spec used to convert float values to Decimal at the configured precision
+DECIMAL_FORMAT = f"{{:.{settings.DYNAMODB_DECIMAL_PRECISION_DIGITS}f}}"
+
+
+def prepare_request_attributes(item: dict) -> dict:
+    """
+    Prepare the REQUESTS table attribute values set for the given item, keyed by attribute name
+
+    Shared by update_item() and prepare_request_item() so that both paths write the same values:
+    - `errors` defaults to "[]" when missing or None
+    - `updated_timestamp`/`completed_timestamp` default to the current UTC timestamp when missing or None
+    """
+    errors_field_value = item.get("errors")
+    if errors_field_value is None:
+        errors_field_value = "[]"
+    updated_timestamp = item.get("updated_timestamp")
+    completed_timestamp = item.get("completed_timestamp")
+    if updated_timestamp is None or completed_timestamp is None:
+        processed_timestamp_utc = int(time.time())  # UTC epoch seconds
+        updated_timestamp = processed_timestamp_utc if updated_timestamp is None else updated_timestamp
+        completed_timestamp = processed_timestamp_utc if completed_timestamp is None else completed_timestamp
+    names = UPDATE_ITEM_EXPRESSION_ATTRIBUTE_NAMES
+    return {
+        names["#s"]: item[RESULTS_TABLE_STATE_FIELDNAME],
+        names["#r"]: item["result_s3_uris"],
+        names["#e"]: errors_field_value,
+        names["#u"]: updated_timestamp,
+        names["#c"]: completed_timestamp,
+    }
+
+
+def update_item(item: dict, table) -> dict:
     """
     Update the given item entry in the Dynamodb REQUESTS table
 
+    table: REQUESTS table resource, `get_dynamodb_table(tablename)`, expected to be created once and re-used
+
     item is expected to have the following keys:
     - REQUESTS_TABLE_HASHKEY_KEYNAME
     - RESULTS_TABLE_STATE_FIELDNAME
     """
-    table = DYNAMODB.Table(tablename)
-    logger.info(f"Updating item in Table({tablename})...")
+    logger.info(f"Updating item in Table({table.name})...")
     logger.debug(f"item: {item}")
 
-    processed_timestamp_utc = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
     try:
-        # Assure that updated `errors` field is not None
-        errors_field_value = "[]"
-        if "errors" in item and item["errors"] is not None:
-            errors_field_value = item["errors"]
-        logger.info(f"errors={errors_field_value}")
+        attributes = prepare_request_attributes(item)
+        logger.info(f"errors={attributes['errors']}")
         response = table.update_item(
-            Key={settings.DYNAMODB_REQUESTS_TABLE_HASHKEY_KEYNAME: item[settings.DYNAMODB_REQUESTS_TABLE_HASHKEY_KEYNAME]},
-            UpdateExpression=(
-                # should be REQUESTS_TABLE_RESULTS_KEYNAME
-                "SET #s = :predictor_status, #r = :result_s3_uris, #e = :errors, #u = :updated_timestamp, #c = :completed_timestamp"
-            ),
-            ExpressionAttributeNames={
-                "#s": "predictor_status",  # settings.DYNAMODB_RESULTS_TABLE_STATE_FIELDNAME,
-                "#u": "updated_timestamp",  # settings.DYNAMODB_REQUESTS_TABLE_RESULTS_KEYNAME,
-                "#c": "completed_timestamp",
-                "#r": "result_s3_uris",
-                "#e": "errors",
-            },
-            ExpressionAttributeValues={
-                ":predictor_status": item[settings.DYNAMODB_RESULTS_TABLE_STATE_FIELDNAME],
-                ":result_s3_uris": item["result_s3_uris"],
-                ":errors": errors_field_value,
-                ":updated_timestamp": item.get("updated_timestamp", processed_timestamp_utc),
-                ":completed_timestamp": item.get("completed_timestamp", processed_timestamp_utc),
-            },
+            Key={REQUESTS_TABLE_HASHKEY_KEYNAME: item[REQUESTS_TABLE_HASHKEY_KEYNAME]},
+            UpdateExpression=UPDATE_ITEM_EXPRESSION,
+            ExpressionAttributeNames=UPDATE_ITEM_EXPRESSION_ATTRIBUTE_NAMES,
+            # UPDATE_ITEM_EXPRESSION value placeholders are the attribute names prefixed with ":"
+            ExpressionAttributeValues={f":{name}": value for name, value in attributes.items()},
         )
     except Exception as e:
         logger.exception(e)
-        logger.error(f"unable to put_item() to table: {tablename}")
+        logger.error(f"unable to put_item() to table: {table.name}")
         response = {}
 
     return response
 
 
-def get_nested_keys(record: dict) -> Generator[str, None, None]:
+class BoundedThreadPoolExecutor:
+    """
+    ThreadPoolExecutor limiting the number of submitted (not yet completed) tasks
+
+    submit() blocks once (2 * max_workers) tasks are pending,
+    applying back-pressure to the caller instead of queuing an unbounded number of tasks (and their arguments) in memory.
+    """
+
+    def __init__(self, max_workers: int):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._semaphore = BoundedSemaphore(2 * max_workers)
+
+    def _release(self, future: Future) -> None:
+        self._semaphore.release()
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        self._semaphore.acquire()
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._semaphore.release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+def drain_completed_futures(futures: List[Future]) -> List[Future]:
+    """Log the update_item() responses of completed futures, returning the futures still pending"""
+    pending = []
+    for future in futures:
+        if future.done():
+            log_update_item_response(future.result())
+        else:
+            pending.append(future)
+    return pending
+
+
+def wait_for_futures(futures: List[Future], log_interval: int = 100) -> None:
+    """Wait for the given update_item() futures, logging each response as soon as the related future completes"""
+    total = len(futures)
+    for completed, future in enumerate(as_completed(futures), 1):
+        log_update_item_response(future.result())
+        if completed % log_interval == 0 or completed == total:
+            logger.info(f"update_item() futures completed: {completed}/{total}")
+
+
+def prepare_request_item(item: dict) -> dict:
+    """
+    Build the full REQUESTS table item for the given item, used when overwriting request entries with put_item()
+
+    Contains the same attributes set by update_item().
+    """
+    request_item = {REQUESTS_TABLE_HASHKEY_KEYNAME: item[REQUESTS_TABLE_HASHKEY_KEYNAME]}
+    request_item.update(prepare_request_attributes(item))
+    return request_item
+
+
+def log_update_item_response(response: dict) -> None:
+    """Log the status of a DynamoDB update_item() response"""
+    logger.debug(f"future response: {response}")
+    if response and "ResponseMetadata" in response and "HTTPStatusCode" in response["ResponseMetadata"]:
+        status_code = response["ResponseMetadata"]["HTTPStatusCode"]
+        if status_code != 200:
+            logger.error(f"(update_item) future response: [{status_code}] {response}")
+        else:
+            logger.info(f"(update_item) future response: [{status_code}]")
+    else:
+        logger.warning(f"future UNKNOWN response: {response}")
+
+
+def get_nested_keys(record: dict) -> List[str]:
     """get all keys in a dictionary that contains nested mappings/elements"""
-    for k, v in record.items():
-        if isinstance(v, (list, tuple, dict)):
-            yield k
+    return [k for k, v in record.items() if type(v) not in UNCONVERTED_VALUE_TYPES and isinstance(v, NESTED_VALUE_TYPES)]
+
+
+@lru_cache(maxsize=4096)
+def _to_decimal(value: float) -> Decimal:
+    """
+    Convert float to Decimal at the configured precision
+
+    Prediction scores commonly repeat across results, cache the (immutable) Decimal instances to reuse them.
+    """
+    return Decimal(DECIMAL_FORMAT.format(value))
 
 
 def check_and_convert(value, precision=settings.DYNAMODB_DECIMAL_PRECISION_DIGITS):
-    """convert float to decimal for dynamodb"""
-    return value if not isinstance(value, float) else round(Decimal(value), precision)
+    """
+    Convert float to decimal for dynamodb
+
+    The float is formatted directly to the requested precision and the resulting string is used to create the Decimal,
+    this avoids the exact binary-to-decimal expansion of Decimal(float) and the following round().
+    """
+    if not isinstance(value, float):
+        return value
+    # zero values bypass the cache, 0.0 == -0.0 so a cached result would lose the sign of -0.0
+    if precision == settings.DYNAMODB_DECIMAL_PRECISION_DIGITS and value:
+        return _to_decimal(value)
+    return Decimal(f"{value:.{precision}f}")
+
+
+class DecimalTypeSerializer(TypeSerializer):
+    """
+    TypeSerializer that accepts float values, converting them with check_and_convert()
+
+    Allows items containing float values to be serialized to DynamoDB AttributeValues in a single pass,
+    for use with the low-level dynamodb client.
+    """
+
+    def _is_number(self, value):
+        return isinstance(value, (int, float, Decimal))
+
+    def _serialize_n(self, value):
+        return super()._serialize_n(check_and_convert(value))
 
 
 def prepare_record(record: dict) -> Tuple[dict, dict]:
@@ -83,18 +221,18 @@ def prepare_record(record: dict) -> Tuple[dict, dict]:
     original_nested_data: untouched nested key record data
     """
     original_nested_data = {}  # used for processing the results into the results table
-    nested_keys = get_nested_keys(record)
-    if not nested_keys:
-        logger.warning(f"No nested_keys found for record: {record}")
-    else:
-        for nested_key in nested_keys:
+    # partition nested and non-nested values in a single pass
+    for key, value in record.items():
+        if type(value) in UNCONVERTED_VALUE_TYPES:
+            continue
+        if isinstance(value, NESTED_VALUE_TYPES):
             # jsonize and byteify nested items
-            value = record[nested_key]
-            original_nested_data[nested_key] = value  # keep original value for later processing
-            value_json_bytes = json.dumps(value)
-            record[nested_key] = value_json_bytes
-    non_nested_keys = set(record.keys()) - set(nested_keys)
-    for k in non_nested_keys:
-        v = record[k]
-        record[k] = check_and_convert(v)
+            original_nested_data[key] = value  # keep original value for later processing
+            record[key] = json_dumps(value)
+        elif isinstance(value, float):
+            # inline check_and_convert(), avoiding a call for every non-float value
+            record[key] = _to_decimal(value) if value else Decimal(DECIMAL_FORMAT.format(value))
+    if not original_nested_data:
+        # record is only formatted when the message is emitted
+        logger.warning("No nested_keys found for record: %s", record)
     return record, original_nested_data
@@ -1,5 +1,7 @@
 import logging
 import signal
+import threading
+import time
 from abc import abstractmethod
 from typing import Any, Optional, Union
 
@@ -20,16 +22,37 @@ class PredictorBase:
     __version__ = "0.1.0"
 
     PROCESSING_TIMEOUT_SECONDS = None
+    _predict_deadline = None  # time.monotonic() deadline, used when set_predict_timeout() is called outside of the main thread
 
     def set_predict_timeout(self, timeout_seconds: int) -> None:
         """
         Issues signal.alarm({timeout_seconds}) when called.
         igata SIGALRM signal handler raises igata.exceptions.PredictTimeoutError.
+
+        .. note::
+
+            signals can only be used in the main thread,
+            when called from another thread the timeout is checked once predict() returns (see `check_predict_timeout()`).
         """
         logger.info(f"processing_timeout set (PredictTimeoutError exception will be raised on timeout): {timeout_seconds}s")
         self.PROCESSING_TIMEOUT_SECONDS = timeout_seconds
-        signal.signal(signal.SIGALRM, sigalrm_handler)
-        signal.alarm(timeout_seconds)
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGALRM, sigalrm_handler)
+            signal.alarm(timeout_seconds)
+        else:
+            self._predict_deadline = time.monotonic() + timeout_seconds
+
+    def check_predict_timeout(self) -> None:
+        """Raise igata.exceptions.PredictTimeoutError if the timeout set outside of the main thread has been exceeded"""
+        if self._predict_deadline is not None and time.monotonic() > self._predict_deadline:
+            self._predict_deadline = None
+            raise PredictTimeoutError("predict() timedout!")
+
+    def cancel_predict_timeout(self) -> None:
+        """Cancel the timeout set with `set_predict_timeout()`"""
+        if threading.current_thread() is threading.main_thread():
+            signal.alarm(0)
+        self._predict_deadline = None
 
     def pre_predict_hook(self, record: Any, info: Optional[dict] = None) -> None:
         """Hook for providing igata.handlers.aws.mixins for additional pre processing. (Intended for signaling, db updates, etc.)"""
@@ -1,14 +1,14 @@
 import gc
-import json
 import logging
 import os
-import signal
+import queue
+import threading
 import time
-from collections import Counter, defaultdict
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from types import FunctionType
-from typing import Tuple, Type, Union
+from typing import Any, Callable, Generator, Iterable, Iterator, List, Tuple, Type, Union
 
-import boto3
 from botocore.exceptions import ClientError
 
 from .. import settings
@@ -16,7 +16,7 @@ from ..exceptions import PredictTimeoutError
 from ..handlers.aws.input import InputCtxManagerBase
 from ..handlers.aws.output import OutputCtxManagerBase
 from ..predictors import PredictorBase
-from ..utils import serialize_json_and_chunk_by_bytes
+from ..utils import get_sns_client, json_dumps, serialize_json_and_chunk_by_bytes
 
 logger = logging.getLogger("cliexecutor")
 
@@ -31,8 +31,13 @@ REQUESTS_COMPLETE_SNS_TOPIC_ARN = os.getenv("REQUESTS_COMPLETE_SNS_TOPIC_ARN", N
 DEFAULT_PREDICTOR_RESULTS_KEYNAME = "result"
 PREDICTOR_RESULTS_KEYNAME = os.getenv("PREDICTOR_RESULTS_KEYNAME", DEFAULT_PREDICTOR_RESULTS_KEYNAME)
 SNS_MAX_MESSAGE_SIZE_BYTES = 262144
-
-SNS = boto3.client("sns", region_name=settings.AWS_REGION, endpoint_url=settings.SNS_ENDPOINT)
+NANOSECONDS_PER_SECOND = 1_000_000_000
+# maximum number of entries accepted by a single SNS publish_batch() call
+SNS_PUBLISH_BATCH_MAX_ENTRIES = 10
+# maximum total payload of a single publish_batch() call (same as the single message limit)
+SNS_PUBLISH_BATCH_MAX_BYTES = 262144
+# request_ids json is escaped when embedded in the json message (at worst doubling its size), leave room for it
+SNS_MESSAGE_REQUEST_IDS_MAX_BYTES = (SNS_MAX_MESSAGE_SIZE_BYTES - 1024) // 2
 
 # optional staticmethods defined in the predictor that can be attached to the INPUT_CTXMGR
 OPTIONAL_PREDICTOR_INPUTCTXMGR_STATICMETHODS = ("get_pandas_read_csv_kwargs",)
@@ -40,6 +45,123 @@ OPTIONAL_PREDICTOR_INPUTCTXMGR_STATICMETHODS = ("get_pandas_read_csv_kwargs",)
 OPTIONAL_PREDICTOR_OUTPUTCTXMGR_STATICMETHODS = ("get_pandas_to_csv_kwargs", "get_additional_dynamodb_request_update_attributes")
 
 
+def prefetch_records(records: Iterable, maxsize: int) -> Generator:
+    """
+    Iterate the given records in a background thread, yielding them as they become available.
+
+    Up to `maxsize` records are read ahead, overlapping record input (downloads) with the processing of the current record.
+    Exceptions raised while iterating the records are re-raised in the calling thread.
+    """
+    buffer = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    done = object()
+
+    def _put(entry: tuple) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _produce() -> None:
+        error = None
+        try:
+            for item in records:
+                if not _put((item, None)):
+                    return  # consumer stopped
+        except Exception as e:
+            error = e
+        finally:
+            if stop.is_set() and hasattr(records, "close"):
+                records.close()
+        _put((done, error))
+
+    thread = threading.Thread(target=_produce, name="prefetch_records", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+class PutRecordWorker:
+    """
+    Call output_ctxmgr.put_record() and predictor.post_predict_hook() for processed records, in submission order.
+
+    When `background` is True the calls are made in a background thread, overlapping the output of a record with the processing of the next record.
+    At most `queue_size` submitted records wait for the background thread.
+    Exceptions raised by put_record()/post_predict_hook() are re-raised on the next `submit()` or on exit.
+    """
+
+    _STOP = object()
+
+    def __init__(self, put_record: Callable, post_predict_hook: Callable, background: bool = False, queue_size: int = 2):
+        self.put_record = put_record
+        self.post_predict_hook = post_predict_hook
+        self.background = background
+        self.total_put_duration = 0.0
+        self.exception = None
+        self._queue = None
+        self._thread = None
+        if self.background:
+            self._queue = queue.Queue(maxsize=queue_size)
+            self._thread = threading.Thread(target=self._run, name="PutRecordWorker", daemon=True)
+
+    def __enter__(self):
+        if self._thread is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._thread is not None:
+            # wait for the records already submitted
+            self._queue.put(self._STOP)
+            self._thread.join()
+            if exc_type is None and self.exception is not None:
+                raise self.exception
+
+    def _put_record(self, record: Any, record_results: dict, meta: dict) -> None:
+        put_start = time.perf_counter_ns()
+        logger.debug("calling output_ctxmgr.put_record(record_results)...")
+        response = self.put_record(record_results)
+        logger.debug("output_ctxmgr.put_record(): response=%s", response)
+        put_duration = (time.perf_counter_ns() - put_start) / NANOSECONDS_PER_SECOND
+        logger.info("put_duration: %.4f", put_duration)
+        self.total_put_duration += put_duration
+        self.post_predict_hook(record, response, meta)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                break
+            if self.exception is not None:
+                continue  # discard the remaining records after a failure
+            try:
+                self._put_record(*item)
+            except Exception as e:
+                logger.exception(e)
+                self.exception = e
+
+    def submit(self, record: Any, record_results: dict, meta: dict) -> None:
+        if not self.background:
+            self._put_record(record, record_results, meta)
+            return
+        if self.exception is not None:
+            raise self.exception
+        # meta is updated for each record, pass a copy to the background thread
+        self._queue.put((record, record_results, dict(meta)))
+
+
 class PredictionExecutor:
     """Main executor for running user-defined Predictors (Predictor classes that sub-class igata.predictors.PredictorBase)"""
 
@@ -56,6 +178,11 @@ class PredictionExecutor:
         self._input_settings = input_settings
         self.output_ctx_manager = output_ctx_manager
         self._output_settings = output_settings
+        self._add_optional_predictor_staticmethods(OPTIONAL_PREDICTOR_INPUTCTXMGR_STATICMETHODS, self._input_settings, "INPUT")
+        self._add_optional_predictor_staticmethods(OPTIONAL_PREDICTOR_OUTPUTCTXMGR_STATICMETHODS, self._output_settings, "OUTPUT")
+        # optional predictor methods, resolved once instead of per record
+        self._predictor_preprocess_input = getattr(self.predictor, "preprocess_input", None)
+        self._predictor_postprocess_output = getattr(self.predictor, "postprocess_output", None)
 
         # Log predictor version
         predictor_version = "not defined"
@@ -64,6 +191,15 @@ class PredictionExecutor:
         self.predictor_version = predictor_version
         logger.info(f"predictor({self.predictor.__class__.__name__}).__version__: {self.predictor_version}")
 
+    @staticmethod
+    def _append_error(info: dict, error_message: str) -> None:
+        """Add the error_message to the 'errors' list of the given record info"""
+        errors = info.get("errors")
+        if not errors:
+            info["errors"] = [error_message]
+        else:
+            errors.append(error_message)
+
     def _prepare_sns_notification_data(self, info: dict) -> Tuple[str, str]:
         """Get the SNS Topic ARN and RequestId from info if defined"""
         sns_topic_arn = None
@@ -76,50 +212,84 @@ class PredictionExecutor:
                 sns_topic_arn = REQUESTS_COMPLETE_SNS_TOPIC_ARN
 
             if sns_topic_arn:
-                logger.debug(f"using sns_topic_arn: {sns_topic_arn}")
+                logger.debug("using sns_topic_arn: %s", sns_topic_arn)
                 request_id = info[REQUEST_UNIQUE_ID_FIELDNAME]
         return sns_topic_arn, request_id
 
+    @staticmethod
+    def _prepare_sns_publish_batch_entries(request_ids: list) -> Iterator[List[dict]]:
+        """
+        Yield SNS publish_batch() entries for the given request_ids
+
+        Batches are limited to both SNS_PUBLISH_BATCH_MAX_ENTRIES entries and SNS_PUBLISH_BATCH_MAX_BYTES total message bytes.
+        """
+        entries = []
+        batch_bytes = 0
+        for request_ids_json in serialize_json_and_chunk_by_bytes(request_ids, max_bytes=SNS_MESSAGE_REQUEST_IDS_MAX_BYTES):
+            message = json_dumps({"default": request_ids_json})
+            message_bytes = len(message.encode("utf8"))
+            if entries and (len(entries) >= SNS_PUBLISH_BATCH_MAX_ENTRIES or batch_bytes + message_bytes > SNS_PUBLISH_BATCH_MAX_BYTES):
+                yield entries
+                entries = []
+                batch_bytes = 0
+            entries.append({"Id": str(len(entries)), "Message": message, "MessageStructure": "json"})
+            batch_bytes += message_bytes
+        if entries:
+            yield entries
+
+    @staticmethod
+    def _publish_sns_topic(sns_topic_arn: str, request_ids: list) -> int:
+        """Publish the given request_ids to the SNS topic, returning the number of published messages"""
+        published_message_count = 0
+        sns = get_sns_client()
+        logger.info(f"sending request_ids to SNS_TOPIC_ARN({sns_topic_arn}) ...")
+        for entries in PredictionExecutor._prepare_sns_publish_batch_entries(request_ids):
+            try:
+                response = sns.publish_batch(TopicArn=sns_topic_arn, PublishBatchRequestEntries=entries)
+                published_message_count += len(response.get("Successful", []))
+                for failed in response.get("Failed", []):
+                    logger.error(
+                        f"Unable to publish entry({failed['Id']}) to given SNS_TOPIC_ARN({sns_topic_arn}): "
+                        f"{failed.get('Code')} {failed.get('Message')} (SenderFault={failed.get('SenderFault')})"
+                    )
+            except sns.exceptions.NotFoundException as e:
+                logger.error(f"(NotFoundException) Unable to publish to given SNS_TOPIC_ARN({sns_topic_arn}: {e.args}")
+            except ClientError as e:
+                logger.error(f"(ClientError) Unable to publish to given SNS_TOPIC_ARN({sns_topic_arn}: {e.args}")
+        return published_message_count
+
     @staticmethod
     def _handle_sns_notifications(notifications: Union[dict, None]) -> int:
-        """handle sns notifications if defined"""
+        """handle sns notifications if defined, topics are published to concurrently"""
         published_message_count = 0
         if notifications:
             logger.debug("sending SNS notifications...")
-            for sns_topic_arn, request_ids in notifications.items():
-                logger.info(f"sending request_ids to SNS_TOPIC_ARN({sns_topic_arn}) ...")
-                for request_ids_json in serialize_json_and_chunk_by_bytes(request_ids, max_bytes=SNS_MAX_MESSAGE_SIZE_BYTES):
-                    try:
-                        SNS.publish(TargetArn=sns_topic_arn, Message=json.dumps({"default": request_ids_json}), MessageStructure="json")
-                        published_message_count += 1
-                    except SNS.exceptions.NotFoundException as e:
-                        logger.error(f"(NotFoundException) Unable to publish to given SNS_TOPIC_ARN({sns_topic_arn}: {e.args}")
-                    except ClientError as e:
-                        logger.error(f"(NotFoundException) Unable to publish to given SNS_TOPIC_ARN({sns_topic_arn}: {e.args}")
+            max_workers = min(settings.SNS_PUBLISH_WORKERS, len(notifications))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(PredictionExecutor._publish_sns_topic, sns_topic_arn, request_ids)
+                    for sns_topic_arn, request_ids in notifications.items()
+                ]
+                published_message_count = sum(future.result() for future in futures)
         return published_message_count
 
-    def get_input_ctx_manager_instance(self) -> Union[InputCtxManagerBase, Type[InputCtxManagerBase]]:
-        """Prepare and instantiate the InputCtxManager"""
-        for optional_staticmethod_name in OPTIONAL_PREDICTOR_INPUTCTXMGR_STATICMETHODS:
+    def _add_optional_predictor_staticmethods(self, optional_staticmethod_names: tuple, ctxmgr_settings: dict, label: str) -> None:
+        """Add the optional staticmethods defined in the predictor to the given (INPUT|OUTPUT) ctxmgr settings"""
+        for optional_staticmethod_name in optional_staticmethod_names:
             if hasattr(self.predictor, optional_staticmethod_name):
-                logger.info(f"adding INPUT optional_staticmethod({optional_staticmethod_name})...")
+                logger.info(f"adding {label} optional_staticmethod({optional_staticmethod_name})...")
                 optional_staticmethod = getattr(self.predictor, optional_staticmethod_name)
                 if isinstance(optional_staticmethod, FunctionType):
-                    self._input_settings[optional_staticmethod_name] = optional_staticmethod
+                    ctxmgr_settings[optional_staticmethod_name] = optional_staticmethod
                 else:
-                    logger.error(f"OPTIONAL_PREDICTOR_INPUTCTXMGR_STATICMETHOD({optional_staticmethod_name}) is not a staticmethod, SKIPPING!")
+                    logger.error(f"OPTIONAL_PREDICTOR_{label}CTXMGR_STATICMETHOD({optional_staticmethod_name}) is not a staticmethod, SKIPPING!")
+
+    def get_input_ctx_manager_instance(self) -> Union[InputCtxManagerBase, Type[InputCtxManagerBase]]:
+        """Instantiate the InputCtxManager (optional predictor staticmethods are added to the settings on __init__)"""
         return self.input_ctx_manager(**self._input_settings)
 
     def get_output_ctx_manager_instance(self) -> Union[OutputCtxManagerBase, Type[OutputCtxManagerBase]]:
-        """Prepare and instantiate the OutputCtxManager"""
-        for optional_staticmethod_name in OPTIONAL_PREDICTOR_OUTPUTCTXMGR_STATICMETHODS:
-            if hasattr(self.predictor, optional_staticmethod_name):
-                logger.info(f"adding OUTPUT optional_staticmethod({optional_staticmethod_name})...")
-                optional_staticmethod = getattr(self.predictor, optional_staticmethod_name)
-                if isinstance(optional_staticmethod, FunctionType):
-                    self._output_settings[optional_staticmethod_name] = optional_staticmethod
-                else:
-                    logger.error(f"OPTIONAL_PREDICTOR_OUTPUTCTXMGR_STATICMETHOD({optional_staticmethod_name}) is not a staticmethod, SKIPPING!")
+        """Instantiate the OutputCtxManager (optional predictor staticmethods are added to the settings on __init__)"""
         return self.output_ctx_manager(**self._output_settings)
 
     def execute(self, inputs: Union[list, None] = None) -> Counter:
@@ -135,133 +305,141 @@ class PredictionExecutor:
 
         :returns: Summary of timings
         """
+        perf_counter_ns = time.perf_counter_ns
         summary_results = Counter()
-        sns_notifications = defaultdict(list)
+        sns_notifications = {}  # {sns_topic_arn: [request_id, ...]}
         meta = {"input_settings": self._input_settings, "output_settings": self._output_settings, "request_info": None}
-        with self.get_input_ctx_manager_instance() as input_ctxmgr, self.get_output_ctx_manager_instance() as output_ctxmgr:
-            for record, info in input_ctxmgr.get_records(inputs):  # process records as they become available
-                self.predictor.pre_predict_hook(record, info)
+        records_since_gc_collect = 0
+        # accumulated in locals while processing records, added to summary_results once processing completes
+        errors = total_predictions = 0
+        total_download_duration = total_preprocess_duration = total_predict_duration = total_postprocess_duration = 0.0
+        with self.get_input_ctx_manager_instance() as input_ctxmgr, self.get_output_ctx_manager_instance() as output_ctxmgr, PutRecordWorker(
+            output_ctxmgr.put_record,
+            self.predictor.post_predict_hook,
+            background=settings.EXECUTOR_BACKGROUND_PUT_RECORD,
+            queue_size=settings.EXECUTOR_BACKGROUND_PUT_RECORD_QUEUE_SIZE,
+        ) as put_record_worker:
+            context_manager_specific_info_keys = frozenset(input_ctxmgr.context_manager_specific_info_keys)
+            # bound methods called per record
+            predict = self.predictor.predict
+            check_predict_timeout = self.predictor.check_predict_timeout
+            cancel_predict_timeout = self.predictor.cancel_predict_timeout
+            pre_predict_hook = self.predictor.pre_predict_hook
+            submit_put_record = put_record_worker.submit
+            records = input_ctxmgr.get_records(inputs)
+            if settings.EXECUTOR_PREFETCH_RECORDS:
+                records = prefetch_records(records, maxsize=settings.EXECUTOR_PREFETCH_RECORDS)
+            for record, info in records:  # process records as they become available
+                pre_predict_hook(record, info)
                 if "is_valid" in info and not info["is_valid"]:
-                    error_message = "is_valid=False, record not processed, SKIPPING"
-                    if "errors" not in info:
-                        info["errors"] = [error_message]
-                    else:
-                        info["errors"].append(error_message)
+                    self._append_error(info, "is_valid=False, record not processed, SKIPPING")
                     record_results = info
-                    summary_results["errors"] += 1
+                    errors += 1
                 else:
                     if PREDICTOR_RESULTS_KEYNAME in info:
                         info.pop(PREDICTOR_RESULTS_KEYNAME)  # to assure that None does not overwrite actual result
-                    if hasattr(record, "any") and not record.any():  # or not record:  # support both numpy empty array and None
+                    if hasattr(record, "size") and record.size == 0:  # empty numpy array (or DataFrame) returned on input error
                         # handle error case
                         info["result"] = None
                         record_results = info
-                        logger.error(f"Unable to process image request error info will be returned: results={record_results}")
-                        summary_results["errors"] += 1
+                        logger.error("Unable to process image request error info will be returned: results=%s", record_results)
+                        errors += 1
                     else:
                         record_in_error = False
                         if "download_time" in info:
-                            summary_results["total_download_duration"] += info["download_time"]
+                            total_download_duration += info["download_time"]
                         meta["request_info"] = info
-                        if hasattr(self.predictor, "preprocess_input"):
-                            preprocess_start = time.time()
-                            record = self.predictor.preprocess_input(record, meta)
-                            preprocess_end = time.time()
-                            preprocess_duration = round(preprocess_end - preprocess_start, 4)
-                            logger.info(f"preprocess_duration: {preprocess_duration}")
-                            summary_results["total_preprocess_duration"] += preprocess_duration
-
-                        predict_start = time.time()
+                        if self._predictor_preprocess_input is not None:
+                            preprocess_start = perf_counter_ns()
+                            record = self._predictor_preprocess_input(record, meta)
+                            preprocess_duration = (perf_counter_ns() - preprocess_start) / NANOSECONDS_PER_SECOND
+                            logger.info("preprocess_duration: %.4f", preprocess_duration)
+                            total_preprocess_duration += preprocess_duration
+
+                        predict_start = perf_counter_ns()
                         try:
-                            logger.debug(f"calling self.predictor.predict(record, meta): meta={meta}")
-                            record_results = self.predictor.predict(record, meta)
+                            logger.debug("calling self.predictor.predict(record, meta): meta=%s", meta)
+                            try:
+                                record_results = predict(record, meta)
+                                check_predict_timeout()
+                            finally:
+                                if self.predictor.PROCESSING_TIMEOUT_SECONDS:
+                                    cancel_predict_timeout()
                             assert isinstance(record_results, dict)
                             # add request data to result record
-                            if "request_info" in meta and meta["request_info"]:
+                            request_info = meta.get("request_info")
+                            if request_info:
                                 # remove input_ctxmgr specific keys
-                                request_info = {
-                                    k: v for k, v in meta["request_info"].items() if k not in input_ctxmgr.context_manager_specific_info_keys
-                                }
-                                record_results.update(request_info)
-                                logger.debug(f"Added request info to resulting record_results: {record_results}")
+                                record_results.update({k: v for k, v in request_info.items() if k not in context_manager_specific_info_keys})
+                                logger.debug("Added request info to resulting record_results: %s", record_results)
                         except PredictTimeoutError:
                             error_message = f"set Predict Timeout value exceeded: {self.predictor.PROCESSING_TIMEOUT_SECONDS}s"
                             logger.error(error_message)
-                            if "errors" not in info:
-                                info["errors"] = [error_message]
-                            else:
-                                if not info["errors"]:
-                                    info["errors"] = []
-                                info["errors"].append(error_message)
+                            self._append_error(info, error_message)
                             record_results = info
                             record_in_error = True
-                            summary_results["errors"] += 1
+                            errors += 1
 
                         except Exception as e:
                             # collect traceback
                             logger.exception(e)
-                            error_message = f"{e.__class__.__name__}: {e.args}"
-                            if "errors" not in info:
-                                info["errors"] = [error_message]
-                            else:
-                                if not info["errors"]:
-                                    info["errors"] = []
-                                info["errors"].append(error_message)
+                            self._append_error(info, f"{e.__class__.__name__}: {e.args}")
                             record_results = info
                             record_in_error = True
-                            summary_results["errors"] += 1
-
-                        logger.debug(f"predictor.predict() results: {record_results}")
-                        predict_end = time.time()
-                        predict_duration = round(predict_end - predict_start, 4)
-                        logger.info(f"predict_duration: {predict_duration}")
-                        summary_results["total_predict_duration"] += predict_duration
-                        summary_results["total_predictions"] += 1
-
-                        if hasattr(self.predictor, "postprocess_output") and not record_in_error:
-                            postprocess_start = time.time()
-                            record_results = self.predictor.postprocess_output(record_results, meta)
-                            logger.debug(f"predictor.postprocess_output() results: {record_results}")
-                            postprocess_end = time.time()
-                            postprocess_duration = round(postprocess_end - postprocess_start, 4)
-                            logger.info(f"postprocess_duration: {postprocess_duration}")
-                            summary_results["total_postprocess_duration"] += postprocess_duration
-                if self.predictor.PROCESSING_TIMEOUT_SECONDS:
-                    # cancel predict timeout
-                    signal.alarm(0)
-
-                put_start = time.time()
-                logger.debug("calling output_ctxmgr.put_record(record_results)...")
-                response = output_ctxmgr.put_record(record_results)
-                logger.debug(f"output_ctxmgr.put_record(): response={response}")
-                put_end = time.time()
-                put_duration = round(put_end - put_start, 4)
-                logger.info(f"put_duration: {put_duration}")
-                summary_results["total_put_duration"] += put_duration
+                            errors += 1
+
+                        logger.debug("predictor.predict() results: %s", record_results)
+                        predict_duration = (perf_counter_ns() - predict_start) / NANOSECONDS_PER_SECOND
+                        logger.info("predict_duration: %.4f", predict_duration)
+                        total_predict_duration += predict_duration
+                        total_predictions += 1
+
+                        if self._predictor_postprocess_output is not None and not record_in_error:
+                            postprocess_start = perf_counter_ns()
+                            record_results = self._predictor_postprocess_output(record_results, meta)
+                            logger.debug("predictor.postprocess_output() results: %s", record_results)
+                            postprocess_duration = (perf_counter_ns() - postprocess_start) / NANOSECONDS_PER_SECOND
+                            logger.info("postprocess_duration: %.4f", postprocess_duration)
+                            total_postprocess_duration += postprocess_duration
+
+                submit_put_record(record, record_results, meta)
 
                 # handle SNS reporting
                 sns_topic_arn, request_id = self._prepare_sns_notification_data(info)
                 if sns_topic_arn and request_id:
-                    sns_notifications[sns_topic_arn].append(request_id)
-                self.predictor.post_predict_hook(record, response, meta)
-                gc.collect()  # force garbage collection post predict
-            context_manager_exit_start = time.time()
+                    topic_request_ids = sns_notifications.get(sns_topic_arn)
+                    if topic_request_ids is None:
+                        sns_notifications[sns_topic_arn] = topic_request_ids = []
+                    topic_request_ids.append(request_id)
+                records_since_gc_collect += 1
+                if settings.GC_COLLECT_EVERY_N_RECORDS and records_since_gc_collect >= settings.GC_COLLECT_EVERY_N_RECORDS:
+                    gc.collect()  # force garbage collection post predict
+                    records_since_gc_collect = 0
+            context_manager_exit_start = perf_counter_ns()
 
         # put time may include operations on output_ctxmgr exit
         # -> update total_put_duration to include output_ctxmgr exit duration
-        context_manager_exit_end = time.time()
-        context_manager_exit_duration = round(context_manager_exit_end - context_manager_exit_start, 4)
+        context_manager_exit_duration = (perf_counter_ns() - context_manager_exit_start) / NANOSECONDS_PER_SECOND
+        summary_results.update(
+            {
+                "errors": errors,
+                "total_predictions": total_predictions,
+                "total_download_duration": total_download_duration,
+                "total_preprocess_duration": total_preprocess_duration,
+                "total_predict_duration": total_predict_duration,
+                "total_postprocess_duration": total_postprocess_duration,
+                "total_put_duration": put_record_worker.total_put_duration,
+            }
+        )
         summary_results["context_manager_exit_duration"] = context_manager_exit_duration
-        logger.info(f"(input|output) context_manager_exit_duration: {context_manager_exit_duration}")
+        logger.info("(input|output) context_manager_exit_duration: %.4f", context_manager_exit_duration)
 
         published_sns_message_count = self._handle_sns_notifications(sns_notifications)
         logger.info(f"published_sns_message_count: {published_sns_message_count}")
-        total_processing_duration = (
-            summary_results["total_preprocess_duration"] + summary_results["total_predict_duration"] + summary_results["total_postprocess_duration"]
-        )
+        total_processing_duration = total_preprocess_duration + total_predict_duration + total_postprocess_duration
         summary_results["total_processing_duration"] = total_processing_duration
-        if summary_results["total_predictions"] > 0:
-            per_prediction_duration = total_processing_duration / summary_results["total_predictions"]
+        if total_predictions > 0:
+            per_prediction_duration = total_processing_duration / total_predictions
             summary_results["per_prediction_duration"] = per_prediction_duration
 
         return summary_results
@@ -4,7 +4,6 @@ Project/package-wide settings
 import datetime
 import logging
 import os
-from distutils.util import strtobool
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +12,29 @@ JST = datetime.timezone(datetime.timedelta(hours=+9), "JST")
 MAX_POST_IMAGES = 50
 
 
+_TRUE_VALUES = frozenset(("y", "yes", "t", "true", "on", "1"))
+_FALSE_VALUES = frozenset(("n", "no", "f", "false", "off", "0"))
+
+
+def _strtobool(value: str) -> bool:
+    """Convert the given string to bool, accepting the same values as (the removed in python 3.12) distutils.util.strtobool()"""
+    lowered = value.lower()
+    if lowered in _TRUE_VALUES:
+        return True
+    if lowered in _FALSE_VALUES:
+        return False
+    raise ValueError(f"invalid truth value {value!r}")
+
+
+def _env_choice(name: str, default: str, valid: tuple) -> str:
+    """Get the environment variable value for `name`, falling back to `default` (with a warning) when not in `valid`"""
+    value = os.getenv(name, default)
+    if value not in valid:
+        logger.warning(f"Invalid {name}({value}), using default: {default}")
+        value = default
+    return value
+
+
 VALID_INPUT_CONTEXT_MANAGER_NAMES = (
     "S3BucketImageInputCtxManager",
     "SQSMessageS3InputImageCtxManager",
@@ -20,18 +42,12 @@ VALID_INPUT_CONTEXT_MANAGER_NAMES = (
 )
 
 DEFAULT_INPUT_CONTEXT_MANAGER_NAME = "SQSMessageS3InputCSVPandasDataFrameCtxManager"
-INPUT_CONTEXT_MANAGER_NAME = os.getenv("INPUT_CONTEXT_MANAGER", DEFAULT_INPUT_CONTEXT_MANAGER_NAME)
-if INPUT_CONTEXT_MANAGER_NAME not in VALID_INPUT_CONTEXT_MANAGER_NAMES:
-    logger.warning(f"Invalid INPUT_CONTEXT_MANAGER({INPUT_CONTEXT_MANAGER_NAME}), using default: {DEFAULT_INPUT_CONTEXT_MANAGER_NAME}")
-    INPUT_CONTEXT_MANAGER_NAME = DEFAULT_INPUT_CONTEXT_MANAGER_NAME
+INPUT_CONTEXT_MANAGER_NAME = _env_choice("INPUT_CONTEXT_MANAGER", DEFAULT_INPUT_CONTEXT_MANAGER_NAME, VALID_INPUT_CONTEXT_MANAGER_NAMES)
 
 VALID_OUTPUT_CONTEXT_MANAGER_NAMES = ("S3BucketPandasDataFrameCsvFileOutputCtxManager", "SQSRecordOutputCtxManager", "DynamodbOutputCtxManager")
 
 DEFAULT_OUTPUT_CONTEXT_MANAGER_NAME = "S3BucketPandasDataFrameCsvFileOutputCtxManager"
-OUTPUT_CONTEXT_MANAGER_NAME = os.getenv("OUTPUT_CONTEXT_MANAGER", DEFAULT_OUTPUT_CONTEXT_MANAGER_NAME)
-if OUTPUT_CONTEXT_MANAGER_NAME not in VALID_OUTPUT_CONTEXT_MANAGER_NAMES:
-    logger.warning(f"Invalid OUTPUT_CONTEXT_MANAGER_NAME({OUTPUT_CONTEXT_MANAGER_NAME}), using default: {DEFAULT_OUTPUT_CONTEXT_MANAGER_NAME}")
-    OUTPUT_CONTEXT_MANAGER_NAME = DEFAULT_OUTPUT_CONTEXT_MANAGER_NAME
+OUTPUT_CONTEXT_MANAGER_NAME = _env_choice("OUTPUT_CONTEXT_MANAGER", DEFAULT_OUTPUT_CONTEXT_MANAGER_NAME, VALID_OUTPUT_CONTEXT_MANAGER_NAMES)
 
 
 PREDICTOR_MODULE = os.getenv("PREDICTOR_MODULE", None)
@@ -39,10 +55,10 @@ DEFAULT_PREDICTOR_CLASS_NAME = "Predictor"
 PREDICTOR_CLASS_NAME = os.getenv("PREDICTOR_CLASS_NAME", DEFAULT_PREDICTOR_CLASS_NAME)
 
 DEFAULT_INSTANCE_ON_AWS = "True"
-INSTANCE_ON_AWS = strtobool(os.getenv("INSTANCE_ON_AWS", DEFAULT_INSTANCE_ON_AWS))
+INSTANCE_ON_AWS = _strtobool(os.getenv("INSTANCE_ON_AWS", DEFAULT_INSTANCE_ON_AWS))
 
 DEFAULT_AWS_ENABLE_SPOTINSTANCE_STATE_LOGGING = "True"
-AWS_ENABLE_SPOTINSTANCE_STATE_LOGGING = strtobool(os.getenv("AWS_ENABLE_SPOTINSTANCE_STATE_LOGGING", DEFAULT_AWS_ENABLE_SPOTINSTANCE_STATE_LOGGING))
+AWS_ENABLE_SPOTINSTANCE_STATE_LOGGING = _strtobool(os.getenv("AWS_ENABLE_SPOTINSTANCE_STATE_LOGGING", DEFAULT_AWS_ENABLE_SPOTINSTANCE_STATE_LOGGING))
 
 
 # aws boto3 configurations
@@ -60,6 +76,23 @@ SNS_ENDPOINT = os.getenv("SNS_ENDPOINT", DEFAULT_SNS_ENDPOINT)
 DEFAULT_DYNAMODB_ENDPOINT = f"https://dynamodb.{AWS_REGION}.amazonaws.com"
 DYNAMODB_ENDPOINT = os.getenv("DYNAMODB_ENDPOINT", DEFAULT_DYNAMODB_ENDPOINT)
 
+# boto3 client configuration (applied to the S3 and DynamoDB clients)
+DEFAULT_AWS_CLIENT_CONNECT_TIMEOUT_SECONDS = "10"
+AWS_CLIENT_CONNECT_TIMEOUT_SECONDS = int(os.getenv("AWS_CLIENT_CONNECT_TIMEOUT_SECONDS", DEFAULT_AWS_CLIENT_CONNECT_TIMEOUT_SECONDS))
+
+DEFAULT_AWS_CLIENT_READ_TIMEOUT_SECONDS = "30"
+AWS_CLIENT_READ_TIMEOUT_SECONDS = int(os.getenv("AWS_CLIENT_READ_TIMEOUT_SECONDS", DEFAULT_AWS_CLIENT_READ_TIMEOUT_SECONDS))
+
+DEFAULT_AWS_CLIENT_MAX_ATTEMPTS = "5"
+AWS_CLIENT_MAX_ATTEMPTS = int(os.getenv("AWS_CLIENT_MAX_ATTEMPTS", DEFAULT_AWS_CLIENT_MAX_ATTEMPTS))
+
+VALID_AWS_CLIENT_RETRY_MODES = ("legacy", "standard", "adaptive")
+DEFAULT_AWS_CLIENT_RETRY_MODE = "adaptive"
+AWS_CLIENT_RETRY_MODE = _env_choice("AWS_CLIENT_RETRY_MODE", DEFAULT_AWS_CLIENT_RETRY_MODE, VALID_AWS_CLIENT_RETRY_MODES)
+
+DEFAULT_AWS_CLIENT_MAX_POOL_CONNECTIONS = "64"
+AWS_CLIENT_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_CLIENT_MAX_POOL_CONNECTIONS", DEFAULT_AWS_CLIENT_MAX_POOL_CONNECTIONS))
+
 DEFAULT_DYNAMODB_DECIMAL_PRECISION_DIGITS = "6"
 DYNAMODB_DECIMAL_PRECISION_DIGITS = int(os.getenv("DYNAMODB_DECIMAL_PRECISION_DIGITS", DEFAULT_DYNAMODB_DECIMAL_PRECISION_DIGITS))
 
@@ -97,6 +130,50 @@ DYNAMODB_DEFAULT_RESULTS_KEYNAME = "result"
 DYNAMODB_REQUESTS_TABLE_RESULTS_KEYNAME = os.getenv("REQUESTS_TABLE_RESULTS_KEYNAME", DYNAMODB_DEFAULT_RESULTS_KEYNAME)
 DYNAMODB_REQUESTS_TABLE_HASHKEY_KEYNAME = os.getenv("REQUESTS_TABLE_HASHKEY_KEYNAME", "job_id")
 
+# When True, REQUESTS table entries are overwritten with BatchWriteItem (put) instead of being updated with UpdateItem
+# --> NOTE: attributes not managed by the output context manager are *dropped* from the request entry
+DEFAULT_DYNAMODB_REQUESTS_TABLE_OVERWRITE = "False"
+DYNAMODB_REQUESTS_TABLE_OVERWRITE = _strtobool(os.getenv("DYNAMODB_REQUESTS_TABLE_OVERWRITE", DEFAULT_DYNAMODB_REQUESTS_TABLE_OVERWRITE))
+
+# csv writer used by S3BucketPandasDataFrameCsvFileOutputCtxManager
+# --> "pyarrow" requires the optional `pyarrow` package, output formatting differs from pandas (ex: booleans written as "true"/"false")
+VALID_S3BUCKET_OUTPUT_CSV_WRITERS = ("pandas", "pyarrow")
+DEFAULT_S3BUCKET_OUTPUT_CSV_WRITER = "pandas"
+S3BUCKET_OUTPUT_CSV_WRITER = _env_choice("S3BUCKET_OUTPUT_CSV_WRITER", DEFAULT_S3BUCKET_OUTPUT_CSV_WRITER, VALID_S3BUCKET_OUTPUT_CSV_WRITERS)
+
+# when True, S3BucketPandasDataFrameCsvFileOutputCtxManager gzips all csv outputs (adding the ".gz" extension to the output filename)
+DEFAULT_S3BUCKET_OUTPUT_FORCE_GZIP_COMPRESSION = "False"
+S3BUCKET_OUTPUT_FORCE_GZIP_COMPRESSION = _strtobool(
+    os.getenv("S3BUCKET_OUTPUT_FORCE_GZIP_COMPRESSION", DEFAULT_S3BUCKET_OUTPUT_FORCE_GZIP_COMPRESSION)
+)
+
+DEFAULT_DYNAMODB_WRITER_THREADS = "8"
+DYNAMODB_WRITER_THREADS = int(os.getenv("DYNAMODB_WRITER_THREADS", DEFAULT_DYNAMODB_WRITER_THREADS))
+# number of prepared detailed result items submitted for writing together, bounding the items held in memory
+DEFAULT_DYNAMODB_DETAILED_RESULTS_FLUSH_ITEMS = "1000"
+DYNAMODB_DETAILED_RESULTS_FLUSH_ITEMS = int(os.getenv("DYNAMODB_DETAILED_RESULTS_FLUSH_ITEMS", DEFAULT_DYNAMODB_DETAILED_RESULTS_FLUSH_ITEMS))
+
+# number of processed records between forced garbage collections in PredictionExecutor.execute(), 0 disables forced collection
+DEFAULT_GC_COLLECT_EVERY_N_RECORDS = "64"
+GC_COLLECT_EVERY_N_RECORDS = int(os.getenv("GC_COLLECT_EVERY_N_RECORDS", DEFAULT_GC_COLLECT_EVERY_N_RECORDS))
+
+# number of input records read ahead (downloaded) in a background thread while the current record is processed, 0 disables read ahead
+DEFAULT_EXECUTOR_PREFETCH_RECORDS = "4"
+EXECUTOR_PREFETCH_RECORDS = int(os.getenv("EXECUTOR_PREFETCH_RECORDS", DEFAULT_EXECUTOR_PREFETCH_RECORDS))
+# when True, PredictionExecutor calls output_ctxmgr.put_record() (and predictor.post_predict_hook()) in a background thread,
+# overlapping the output of a record with the processing of the next record
+DEFAULT_EXECUTOR_BACKGROUND_PUT_RECORD = "False"
+EXECUTOR_BACKGROUND_PUT_RECORD = _strtobool(os.getenv("EXECUTOR_BACKGROUND_PUT_RECORD", DEFAULT_EXECUTOR_BACKGROUND_PUT_RECORD))
+# maximum number of processed records waiting for the background put_record() thread
+DEFAULT_EXECUTOR_BACKGROUND_PUT_RECORD_QUEUE_SIZE = "2"
+EXECUTOR_BACKGROUND_PUT_RECORD_QUEUE_SIZE = int(
+    os.getenv("EXECUTOR_BACKGROUND_PUT_RECORD_QUEUE_SIZE", DEFAULT_EXECUTOR_BACKGROUND_PUT_RECORD_QUEUE_SIZE)
+)
+
+# maximum number of SNS topics published to concurrently
+DEFAULT_SNS_PUBLISH_WORKERS = "16"
+SNS_PUBLISH_WORKERS = int(os.getenv("SNS_PUBLISH_WORKERS", DEFAULT_SNS_PUBLISH_WORKERS))
+
 # fields dependent on api implementation
 DYNAMODB_RESULTS_TABLE_STATE_FIELDNAME = "predictor_status"
 DYNAMODB_RESULTS_ERROR_STATE = "error"
@@ -120,6 +197,13 @@ DEFAULT_OUTPUT_CSV_DELIMITER = os.getenv("DEFAULT_OUTPUT_CSV_DELIMITER", ",")
 # - csv reader settings
 DEFAULT_INPUT_CSV_READER_DIALECT = "excel"
 INPUT_CSV_READER_DIALECT = os.getenv("INPUT_CSV_READER_DIALECT", DEFAULT_INPUT_CSV_READER_DIALECT)
+# parser used by prepare_csv_reader()
+# --> "pandas" tokenizes with the pandas C parser engine, "pyarrow" streams record batches from the (C++) arrow csv reader
+#     and requires the optional `pyarrow` package.
+#     Both yield rows of strings like the python csv module, but INPUT_CSV_READER_DIALECT is ignored and blank lines are skipped
+VALID_INPUT_CSV_READER_ENGINES = ("python", "pandas", "pyarrow")
+DEFAULT_INPUT_CSV_READER_ENGINE = "python"
+INPUT_CSV_READER_ENGINE = _env_choice("INPUT_CSV_READER_ENGINE", DEFAULT_INPUT_CSV_READER_ENGINE, VALID_INPUT_CSV_READER_ENGINES)
 
 # Tuple of available handlers.aws.output.mixins
 VALID_OUTPUT_CTXMGR_MIXINS = ("DynamodbRequestUpdateMixIn",)
@@ -1,39 +1,166 @@
 import csv
 import datetime
+import gzip
 import json
 import logging
+import math
 import os
 import time
 import urllib
-from collections.abc import Hashable
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
-from gzip import GzipFile
+from functools import lru_cache
 from hashlib import md5
 from io import BytesIO, StringIO
 from pathlib import Path
-from typing import Generator, List, Optional, Tuple, Union
+from threading import Lock
+from typing import TYPE_CHECKING, Callable, Generator, Iterable, Iterator, List, Optional, Tuple, Union
 from urllib.error import HTTPError
 from urllib.parse import unquote, urlparse
 from uuid import NAMESPACE_URL, uuid5
 
 import boto3
-import imageio
 import numpy as np
-import pandas
 import requests
+from botocore.config import Config
 from botocore.errorfactory import ClientError
 from igata import settings
 from requests.adapters import HTTPAdapter
 from retry.api import retry_call
 from urllib3 import Retry
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+try:
+    import pyarrow
+    import pyarrow.csv as pyarrow_csv
+except ImportError:
+    pyarrow = None
+
+if TYPE_CHECKING:
+    import pandas
+
 logger = logging.getLogger("cliexecutor")
 
 
 # for generating UUID for request_id
 UUID_NAMESPACE_DNS_NAME = os.getenv("UUID_NAMESPACE_DNS_NAME", "my-api.com")
 
-S3 = boto3.client("s3", endpoint_url=settings.S3_ENDPOINT)
+# shared boto3 client configuration
+# --> connection pool is sized so that worker threads never block waiting for a connection
+_AWS_CLIENT_CONFIG_KWARGS = {
+    "connect_timeout": settings.AWS_CLIENT_CONNECT_TIMEOUT_SECONDS,
+    "read_timeout": settings.AWS_CLIENT_READ_TIMEOUT_SECONDS,
+    "retries": {"max_attempts": settings.AWS_CLIENT_MAX_ATTEMPTS, "mode": settings.AWS_CLIENT_RETRY_MODE},
+    "max_pool_connections": max(
+        settings.AWS_CLIENT_MAX_POOL_CONNECTIONS, settings.DYNAMODB_WRITER_THREADS, settings.DOWNLOAD_WORKERS, settings.SNS_PUBLISH_WORKERS
+    ),
+}
+if "tcp_keepalive" in Config.OPTION_DEFAULTS:  # only available in newer botocore releases, unknown options raise TypeError
+    _AWS_CLIENT_CONFIG_KWARGS["tcp_keepalive"] = True
+AWS_CLIENT_CONFIG = Config(**_AWS_CLIENT_CONFIG_KWARGS)
+
+# boto3 clients/resources are created on first use from a single shared boto3 Session,
+# see get_s3_client(), get_dynamodb_resource(), get_dynamodb_client(), get_sqs_client(), get_sqs_resource()
+# --> get_dynamodb_table() also caches the created Table resources by tablename
+_AWS_SESSION = None
+_AWS_SESSION_LOCK = Lock()
+_AWS_CLIENTS = {}
+_AWS_CLIENTS_LOCK = Lock()
+
+# requests Session and thread pool shared by S3 downloads, see get_download_session(), download_starmap()
+_DOWNLOAD_SESSION = None
+_DOWNLOAD_SESSION_LOCK = Lock()
+_DOWNLOAD_EXECUTOR = None
+_DOWNLOAD_EXECUTOR_LOCK = Lock()
+
+
+def get_aws_session() -> boto3.session.Session:
+    """Return the shared boto3 Session"""
+    global _AWS_SESSION
+    if _AWS_SESSION is None:
+        with _AWS_SESSION_LOCK:
+            if _AWS_SESSION is None:
+                _AWS_SESSION = boto3.session.Session()
+    return _AWS_SESSION
+
+
+def _get_or_create_aws_client(name: str, factory):
+    """Return the shared client for the given name, creating it with factory(session) on first use"""
+    client = _AWS_CLIENTS.get(name)
+    if client is None:
+        session = get_aws_session()  # resolved before acquiring _AWS_CLIENTS_LOCK (not re-entrant)
+        with _AWS_CLIENTS_LOCK:  # boto3 client creation is not thread-safe
+            client = _AWS_CLIENTS.get(name)
+            if client is None:
+                client = factory(session)
+                _AWS_CLIENTS[name] = client
+    return client
+
+
+def get_s3_client():
+    """Return the shared S3 client"""
+    return _get_or_create_aws_client("s3", lambda session: session.client("s3", config=AWS_CLIENT_CONFIG, endpoint_url=settings.S3_ENDPOINT))
+
+
+def get_dynamodb_resource():
+    """Return the shared DynamoDB resource"""
+    return _get_or_create_aws_client(
+        "dynamodb_resource",
+        lambda session: session.resource(
+            "dynamodb", config=AWS_CLIENT_CONFIG, region_name=settings.AWS_REGION, endpoint_url=settings.DYNAMODB_ENDPOINT
+        ),
+    )
+
+
+def get_dynamodb_table(tablename: str):
+    """Return the shared DynamoDB Table resource for the given tablename"""
+    # resolve the resource *before* _get_or_create_aws_client() acquires _AWS_CLIENTS_LOCK (not re-entrant)
+    resource = get_dynamodb_resource()
+    return _get_or_create_aws_client(f"dynamodb_table:{tablename}", lambda session: resource.Table(tablename))
+
+
+def get_dynamodb_client():
+    """Return the shared low-level DynamoDB client (values are *not* automatically serialized)"""
+    return _get_or_create_aws_client(
+        "dynamodb_client",
+        lambda session: session.client(
+            "dynamodb", config=AWS_CLIENT_CONFIG, region_name=settings.AWS_REGION, endpoint_url=settings.DYNAMODB_ENDPOINT
+        ),
+    )
+
+
+def get_sqs_client(region_name: str = settings.AWS_REGION):
+    """Return the shared SQS client for the given region"""
+    return _get_or_create_aws_client(
+        f"sqs_client:{region_name}",
+        lambda session: session.client("sqs", config=AWS_CLIENT_CONFIG, region_name=region_name, endpoint_url=settings.SQS_ENDPOINT),
+    )
+
+
+def get_sqs_resource():
+    """Return the shared SQS resource"""
+    return _get_or_create_aws_client(
+        "sqs_resource",
+        lambda session: session.resource("sqs", config=AWS_CLIENT_CONFIG, region_name=settings.AWS_REGION, endpoint_url=settings.SQS_ENDPOINT),
+    )
+
+
+def get_sns_client():
+    """Return the shared SNS client"""
+    return _get_or_create_aws_client(
+        "sns_client",
+        lambda session: session.client("sns", config=AWS_CLIENT_CONFIG, region_name=settings.AWS_REGION, endpoint_url=settings.SNS_ENDPOINT),
+    )
 
 
 def default_json_encoder(obj):
@@ -45,13 +172,56 @@ def default_json_encoder(obj):
         json_bytes = json.dumps(myobj, default=default_json_encoder)
 
     """
-    if isinstance(obj, datetime.datetime):
+    if isinstance(obj, datetime.date):  # includes datetime.datetime
         return obj.isoformat()
     elif isinstance(obj, Decimal):
         return float(obj)
+    elif isinstance(obj, (np.ndarray, np.generic)):  # serialized natively by orjson (OPT_SERIALIZE_NUMPY)
+        return obj.tolist()
     raise TypeError(f"Object cannot be serialized: {obj}")
 
 
+def _replace_non_finite_floats(obj):
+    """Replace NaN/Infinity float values with None, matching the `orjson` output of non-finite values (null)"""
+    if isinstance(obj, dict):
+        return {key: _replace_non_finite_floats(value) for key, value in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        return [_replace_non_finite_floats(value) for value in obj]
+    elif isinstance(obj, (float, np.floating)) and not math.isfinite(obj):
+        return None
+    elif isinstance(obj, np.ndarray):
+        return _replace_non_finite_floats(obj.tolist())
+    return obj
+
+
+def json_dumps(obj) -> str:
+    """
+    Serialize the given object to a compact JSON formatted str
+
+    `orjson` is an optional dependency, when installed (`pip install orjson`) it is used for faster serialization,
+    otherwise the standard `json` module is used.
+    Both produce the same output, so the resulting (stored) JSON does not depend on the installed package:
+    - no whitespace after separators
+    - non-ascii characters are not escaped
+    - NaN/Infinity values are output as `null`
+    Objects not supported natively are serialized with `default_json_encoder`.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=default_json_encoder, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY).decode("utf8")
+    try:
+        return json.dumps(obj, default=default_json_encoder, separators=(",", ":"), ensure_ascii=False, allow_nan=False)
+    except ValueError:
+        # non-finite float values found (rare), replace them and serialize again
+        return json.dumps(_replace_non_finite_floats(obj), default=default_json_encoder, separators=(",", ":"), ensure_ascii=False)
+
+
+def json_dumps_bytes(obj) -> bytes:
+    """Serialize the given object to compact, utf8 encoded, JSON (same output as `json_dumps()`)"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=default_json_encoder, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json_dumps(obj).encode("utf8")
+
+
 def flatten(nested_object, keystring="", allow_null_strings=True, separator="__") -> Generator[tuple, None, None]:
     """
     Flatten a nested dictionary into a flat/single-level key, value tuple.
@@ -71,20 +241,59 @@ def flatten(nested_object, keystring="", allow_null_strings=True, separator="__"
             flattened_dict = dict(flatten(nested_object))
 
     """
-    if isinstance(nested_object, dict):
-        keystring = f"{keystring}{separator}" if keystring else keystring
-        for key in nested_object:
-            updated_keystring = f"{keystring}{key}"
-            yield from flatten(nested_object[key], updated_keystring, allow_null_strings, separator)
-    elif isinstance(nested_object, list):
-        for list_element in nested_object:
-            yield from flatten(list_element, keystring, allow_null_strings, separator)
-    else:
-        if not allow_null_strings:
-            if nested_object != "":
-                yield keystring, nested_object
+    # walk the nested object with an explicit stack (no recursive generators),
+    # children are pushed in reverse so that values are yielded in the same (depth-first) order as the object is defined
+    stack = [(nested_object, keystring)]
+    while stack:
+        value, keystring = stack.pop()
+        if isinstance(value, dict):
+            keystring = f"{keystring}{separator}" if keystring else keystring
+            stack.extend((child, f"{keystring}{key}") for key, child in reversed(list(value.items())))
+        elif isinstance(value, list):
+            stack.extend((list_element, keystring) for list_element in reversed(value))
         else:
-            yield keystring, nested_object
+            if not allow_null_strings:
+                if value != "":
+                    yield keystring, value
+            else:
+                yield keystring, value
+
+
+PRESIGNED_URL_EXPIRES_IN_SECONDS = 3600
+# cached presigned urls are re-signed every period, leaving at least (EXPIRES_IN - PERIOD) seconds of validity
+PRESIGNED_URL_CACHE_PERIOD_SECONDS = 1800
+
+
+@lru_cache(maxsize=2048)
+def _get_cached_presigned_get_object_url(bucket: str, key: str, period: int) -> str:
+    return get_s3_client().generate_presigned_url(
+        ClientMethod="get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=PRESIGNED_URL_EXPIRES_IN_SECONDS, HttpMethod="GET"
+    )
+
+
+def get_presigned_get_object_url(bucket: str, key: str) -> str:
+    """Get a presigned GET url for the given S3 object, urls are cached (and re-signed) per PRESIGNED_URL_CACHE_PERIOD_SECONDS"""
+    period = int(time.time() // PRESIGNED_URL_CACHE_PERIOD_SECONDS)
+    return _get_cached_presigned_get_object_url(bucket, key, period)
+
+
+def _download_and_decode_image_cv2(bucket: str, key: str, url: str) -> Tuple[np.array, Optional[str]]:
+    """
+    Download the image data with the shared download session and decode it with the (SIMD optimized) OpenCV decoder
+    returning the RGB image array and error message
+    """
+    logger.info(f"downloading ({url})...")
+    response = get_download_session().get(url, timeout=(settings.AWS_CLIENT_CONNECT_TIMEOUT_SECONDS, settings.AWS_CLIENT_READ_TIMEOUT_SECONDS))
+    if not 200 <= response.status_code <= 299:
+        error_message = f"Exception while processing image(s3://{bucket}/{key}): ({response.status_code}) {response.reason}"
+        logger.error(error_message)
+        return np.array([]), error_message
+    bgr_image = cv2.imdecode(np.frombuffer(response.content, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if bgr_image is None:
+        error_message = f"Exception while processing image(s3://{bucket}/{key}): unable to decode image"
+        logger.error(error_message)
+        return np.array([]), error_message
+    return cv2.cvtColor(bgr_image, cv2.COLOR_BGR2RGB), None
 
 
 def prepare_images(bucket, key) -> Tuple[Tuple[str, str], np.array, float, Optional[str]]:
@@ -93,11 +302,17 @@ def prepare_images(bucket, key) -> Tuple[Tuple[str, str], np.array, float, Optio
     """
     error_message = None
     key = unquote(key)
-    url = S3.generate_presigned_url(ClientMethod="get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=3600, HttpMethod="GET")
+    url = get_presigned_get_object_url(bucket, key)
 
     start = time.time()
     try:
-        image = retry_call(imageio.imread, fargs=[url], tries=10)[:, :, :3]
+        if cv2 is not None:
+            image, error_message = _download_and_decode_image_cv2(bucket, key, url)
+        else:
+            import imageio  # deferred, only image inputs require imageio
+
+            # decoded directly to contiguous 3 channel RGB (alpha dropped, grayscale expanded) by the pillow plugin
+            image = retry_call(imageio.imread, fargs=[url], fkwargs={"pilmode": "RGB"}, tries=10)
     except HTTPError as e:
         logger.exception(e)
         error_message = f"Exception while processing image(s3://{bucket}/{key}): ({e.code}) {e.reason}"
@@ -114,14 +329,157 @@ def prepare_images(bucket, key) -> Tuple[Tuple[str, str], np.array, float, Optio
     return (bucket, key), image, download_time, error_message
 
 
-def _download_s3_file(bucket: str, key: str) -> dict:
+def get_download_session() -> requests.Session:
+    """
+    Return the shared (retrying) requests Session used for S3 downloads
+
+    Connections are kept alive and reused between downloads, the pool is sized for the DOWNLOAD_WORKERS download threads.
+    """
+    global _DOWNLOAD_SESSION
+    if _DOWNLOAD_SESSION is None:
+        with _DOWNLOAD_SESSION_LOCK:
+            if _DOWNLOAD_SESSION is None:
+                _DOWNLOAD_SESSION = requests_retry_session(pool_connections=settings.DOWNLOAD_WORKERS, pool_maxsize=settings.DOWNLOAD_WORKERS * 2)
+    return _DOWNLOAD_SESSION
+
+
+def get_download_executor() -> ThreadPoolExecutor:
+    """Return the shared thread pool (DOWNLOAD_WORKERS threads) used to download S3 objects concurrently"""
+    global _DOWNLOAD_EXECUTOR
+    if _DOWNLOAD_EXECUTOR is None:
+        with _DOWNLOAD_EXECUTOR_LOCK:
+            if _DOWNLOAD_EXECUTOR is None:
+                _DOWNLOAD_EXECUTOR = ThreadPoolExecutor(max_workers=settings.DOWNLOAD_WORKERS, thread_name_prefix="download")
+    return _DOWNLOAD_EXECUTOR
+
+
+def download_starmap(func: Callable, iterable: Iterable[tuple], window: Optional[int] = None) -> Iterator:
+    """
+    Call func(*args) for each args in iterable using the shared download thread pool.
+
+    Results are yielded in the order of the given iterable, each as soon as it (and the preceding results) complete.
+    At most `window` (default, DOWNLOAD_WORKERS * 2) calls are submitted ahead of the consumer, bounding the downloaded data held in memory.
+
+    Usage:
+
+        for (bucket, key), image, download_time, error_message in download_starmap(prepare_images, [(bucket, key), ...]):
+            ...
+    """
+    window = window or settings.DOWNLOAD_WORKERS * 2
+    executor = get_download_executor()
+    pending = deque()
+    for args in iterable:
+        pending.append(executor.submit(func, *args))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def prepare_images_batch(bucket_keys: Iterable[Tuple[str, str]]) -> Tuple[List[Tuple[str, str]], np.ndarray, np.ndarray, List[Optional[str]]]:
+    """
+    Download the given (bucket, key) images concurrently (see `prepare_images()`) returning the results as arrays:
+
+        (bucket_keys, images, download_times, error_messages)
+
+    When all images share the same shape, `images` is a single stacked (N, H, W, 3) array suitable for batched prediction,
+    otherwise (ragged shapes or failed downloads) `images` is a 1-D object array of the individual images.
+    """
+    bucket_keys_result = []
+    images = []
+    download_times = []
+    error_messages = []
+    for bucket_key, image, download_time, error_message in download_starmap(prepare_images, bucket_keys):
+        bucket_keys_result.append(bucket_key)
+        images.append(image)
+        download_times.append(download_time)
+        error_messages.append(error_message)
+
+    if images and len({image.shape for image in images}) == 1 and images[0].ndim == 3:
+        images_array = np.stack(images)
+    else:
+        images_array = np.empty(len(images), dtype=object)
+        for index, image in enumerate(images):
+            images_array[index] = image
+    return bucket_keys_result, images_array, np.array(download_times, dtype=np.float64), error_messages
+
+
+def _download_s3_file(bucket: str, key: str) -> requests.Response:
     """Download file from S3"""
-    url = S3.generate_presigned_url(ClientMethod="get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=3600, HttpMethod="GET")
+    url = get_presigned_get_object_url(bucket, key)
     logger.info(f"downloading ({url})...")
-    response = requests_retry_session().get(url)
+    response = get_download_session().get(url, timeout=(settings.AWS_CLIENT_CONNECT_TIMEOUT_SECONDS, settings.AWS_CLIENT_READ_TIMEOUT_SECONDS))
     return response
 
 
+def _get_s3_streaming_body(bucket: str, key: str):
+    """Get the StreamingBody of the given S3 object, the object data is read from the body as it is consumed"""
+    logger.info(f"downloading (s3://{bucket}/{key})...")
+    response = get_s3_client().get_object(Bucket=bucket, Key=key)
+    return response["Body"]
+
+
+def _iter_csv_rows_pandas(
+    fileobj: BytesIO, reader: Union[csv.reader, csv.DictReader], encoding: str, delimiter: str, compression: Optional[str]
+) -> Iterator[Union[dict, list]]:
+    """
+    Parse the csv data with the pandas C parser engine, yielding rows in the same form as the given `reader`
+    (csv.DictReader: dict of header to value, csv.reader: list of values including the header row).
+    All values are kept as strings, empty fields are yielded as "".
+    """
+    import pandas  # deferred, see prepare_csv_dataframe()
+
+    header = 0 if reader is csv.DictReader else None
+    df = pandas.read_csv(
+        fileobj, sep=delimiter, encoding=encoding, compression=compression, header=header, dtype=str, keep_default_na=False, engine="c"
+    )
+    rows = df.itertuples(index=False, name=None)
+    if reader is csv.DictReader:
+        columns = list(df.columns)
+        for row in rows:
+            yield dict(zip(columns, row))
+    else:
+        for row in rows:
+            yield list(row)
+
+
+def _iter_csv_rows_pyarrow(fileobj, reader: Union[csv.reader, csv.DictReader], encoding: str, delimiter: str) -> Iterator[Union[dict, list]]:
+    """
+    Stream the csv data with the arrow csv reader (`pyarrow.csv.open_csv()`), yielding rows in the same form as the given `reader`
+    (csv.DictReader: dict of header to value, csv.reader: list of values including the header row).
+    All values are read as strings, empty fields are yielded as "".
+    """
+    # the first line is parsed to define the (string) column types, it is re-read by arrow
+    header_line = fileobj.readline().decode(encoding)
+    fileobj.seek(0)
+    if not header_line.strip():
+        return
+    header = next(csv.reader([header_line], delimiter=delimiter))
+    if reader is csv.DictReader:
+        column_names = header
+        skip_rows = 1
+    else:
+        column_names = [str(index) for index in range(len(header))]
+        skip_rows = 0
+
+    batches = pyarrow_csv.open_csv(
+        fileobj,
+        read_options=pyarrow_csv.ReadOptions(column_names=column_names, skip_rows=skip_rows, encoding=encoding),
+        parse_options=pyarrow_csv.ParseOptions(delimiter=delimiter),
+        convert_options=pyarrow_csv.ConvertOptions(
+            column_types={name: pyarrow.string() for name in column_names}, strings_can_be_null=False, quoted_strings_can_be_null=False
+        ),
+    )
+    for batch in batches:
+        columns = [column.to_pylist() for column in batch.columns]
+        if reader is csv.DictReader:
+            for row in zip(*columns):
+                yield dict(zip(column_names, row))
+        else:
+            for row in zip(*columns):
+                yield list(row)
+
+
 def prepare_csv_reader(
     bucket: str,
     key: str,
@@ -137,8 +495,10 @@ def prepare_csv_reader(
     error_message = None
     csvreader = None
     key = unquote(key)
-    if key.lower().endswith((".csv", ".gz")):
-        start = time.time()
+    suffix = Path(key).suffix.lower()
+    start = time.time()
+    if suffix in (".csv", ".gz"):
+        response = None
         try:
             response = _download_s3_file(bucket, key)
         except HTTPError as e:
@@ -151,15 +511,24 @@ def prepare_csv_reader(
             error_message = f"Exception while processing csv(s3://{bucket}/{key}): {e.args}"
             logger.error(error_message)
 
-        if 200 <= response.status_code <= 299:
-            if key.lower().endswith(".gz"):
-                data = GzipFile(fileobj=BytesIO(response.content)).read().decode(encoding)
-                csvreader = reader(StringIO(data), dialect=dialect, delimiter=delimiter)
-            elif key.lower().endswith(".csv"):
+        if response is not None and 200 <= response.status_code <= 299:
+            if settings.INPUT_CSV_READER_ENGINE == "pyarrow" and pyarrow is not None and reader in (csv.DictReader, csv.reader):
+                fileobj = BytesIO(response.content)
+                if suffix == ".gz":
+                    fileobj = gzip.GzipFile(fileobj=fileobj)
+                csvreader = _iter_csv_rows_pyarrow(fileobj, reader, encoding, delimiter)
+            elif settings.INPUT_CSV_READER_ENGINE == "pandas" and reader in (csv.DictReader, csv.reader):
+                compression = "gzip" if suffix == ".gz" else None
+                csvreader = _iter_csv_rows_pandas(BytesIO(response.content), reader, encoding, delimiter, compression)
+            elif suffix == ".gz":
+                # decompress and decode lazily as the reader consumes lines
+                data = gzip.open(BytesIO(response.content), mode="rt", encoding=encoding, newline="")
+                csvreader = reader(data, dialect=dialect, delimiter=delimiter)
+            else:
                 data = response.text
                 csvreader = reader(StringIO(data), dialect=dialect, delimiter=delimiter)
 
-        else:
+        elif response is not None:
             error_message = f"({response.status_code}) error downloading data"
     else:
         error_message = f"unsupported CSV file extension: s3://{bucket}/{key}"
@@ -170,54 +539,57 @@ def prepare_csv_reader(
     return (bucket, key), csvreader, download_time, error_message
 
 
+# pandas.read_csv() kwargs used when none are given to prepare_csv_dataframe()
+# --> the single character default delimiter is supported by the (fast) C parser engine
+READ_CSV_DEFAULT_KWARGS = {
+    "sep": settings.DEFAULT_INPUT_CSV_DELIMITER,
+    "encoding": settings.DEFAULT_INPUT_CSV_ENCODING,
+    "header": settings.DEFAULT_INPUT_CSV_HEADER_LINES,
+    "engine": "c",
+}
+CSV_COMPRESSION_EXT_MAPPING = {".zip": "zip", ".gz": "gzip", ".xz": "xz", ".bz2": "bz2"}
+
+
 def prepare_csv_dataframe(
     bucket: str, key: str, read_csv_kwargs: Optional[dict] = None
-) -> Tuple[Tuple[str, str], Optional[pandas.DataFrame], float, Optional[str]]:
-    """Read CSV from s3 and return a dataframe"""
+) -> Tuple[Tuple[str, str], Optional["pandas.DataFrame"], float, Optional[str]]:
+    """Read CSV from s3 and return a dataframe (the S3 object body is streamed to pandas.read_csv())"""
+    import pandas  # deferred, importing igata.utils does not require loading pandas
+
     df = None
     error_message = None
-    response = None
+    body = None
     start = time.time()
     try:
-        response = _download_s3_file(bucket, key)
-    except HTTPError as e:
+        body = _get_s3_streaming_body(bucket, key)
+    except ClientError as e:
         logger.exception(e)
-        error_message = f"Exception while processing csv(s3://{bucket}/{key}): ({e.code}) {e.reason}"
+        error_message = f"Exception while processing csv(s3://{bucket}/{key}): {e.args}"
         logger.error(error_message)
 
-    if response:
-        if 200 <= response.status_code <= 299:
-            filename = Path(key.split("/")[-1])
-            data = BytesIO(response.content)
-            data.name = filename.name
-
-            if not read_csv_kwargs:
-                # set defaults
-                read_csv_kwargs = {
-                    "sep": settings.DEFAULT_INPUT_CSV_DELIMITER,
-                    "encoding": settings.DEFAULT_INPUT_CSV_ENCODING,
-                    "header": settings.DEFAULT_INPUT_CSV_HEADER_LINES,
-                }
-
-            # - determine compression
-            ext = filename.suffix.lower()
-            compression_ext_mapping = {".zip": "zip", ".gz": "gzip", ".xz": "xz", ".bz2": "bz2"}
-            compression = compression_ext_mapping.get(ext, None)
-            if compression and "compression" not in read_csv_kwargs:
-                read_csv_kwargs["compression"] = compression
-
-            logger.debug(f"read_csv_kwargs={read_csv_kwargs}")
-            try:
-                df = pandas.read_csv(data, **read_csv_kwargs)
-            except Exception as e:
-                logger.exception(e)
-                error_message = f"Exception Occurred while calling pandas.read_csv(): {e.args}"
-        else:
-            error_message = f"Invalid response.status_code while processing csv(s3://{bucket}/{key}): status_code={response.status_code}"
-            logger.error(error_message)
-    else:
-        error_message = f"response not defined, download failed for: s3://{bucket}/{key}"
-        logger.error("response not defined!")
+    if body is not None:
+        filename = Path(key.split("/")[-1])
+
+        # copy, the given kwargs are updated below and may be shared between calls
+        read_csv_kwargs = dict(read_csv_kwargs) if read_csv_kwargs else dict(READ_CSV_DEFAULT_KWARGS)
+
+        # - determine compression
+        ext = filename.suffix.lower()
+        compression = CSV_COMPRESSION_EXT_MAPPING.get(ext, None)
+        if compression and "compression" not in read_csv_kwargs:
+            read_csv_kwargs["compression"] = compression
+
+        logger.debug(f"read_csv_kwargs={read_csv_kwargs}")
+        try:
+            data = body
+            if read_csv_kwargs.get("compression") == "zip":
+                data = BytesIO(body.read())  # zip archives require a seekable file
+            df = pandas.read_csv(data, **read_csv_kwargs)
+        except Exception as e:
+            logger.exception(e)
+            error_message = f"Exception Occurred while calling pandas.read_csv(): {e.args}"
+        finally:
+            body.close()
 
     end = time.time()
     download_time = end - start
@@ -235,6 +607,12 @@ def parse_s3_uri(uri: str) -> Tuple[str, str]:
     return bucket, key
 
 
+@lru_cache(maxsize=None)
+def _quoted_request_id_url_prefix(uuid_namespace_dns_name: str) -> str:
+    """Get the quoted "http://{uuid_namespace_dns_name}/" prefix of the generate_request_id() uuid5 name"""
+    return urllib.parse.quote_plus(f"http://{uuid_namespace_dns_name}/")
+
+
 def generate_request_id(*values, uuid_namespace_dns_name=UUID_NAMESPACE_DNS_NAME) -> str:
     """
     Generate the UUID string for given values
@@ -244,62 +622,57 @@ def generate_request_id(*values, uuid_namespace_dns_name=UUID_NAMESPACE_DNS_NAME
         values are sorted to ensure key reproducibility
 
     """
-    if not all(isinstance(v, Hashable) for v in values):
+    if not all(type(v).__hash__ is not None for v in values):  # same result as isinstance(v, Hashable), without the ABC check
         raise ValueError(f"Given value not hashable, values: {values}")
-    unique_key = md5(".".join(value for value in sorted(str(v) for v in values)).encode("utf8")).hexdigest()
-    hash_url = urllib.parse.quote_plus(f"http://{uuid_namespace_dns_name}/{unique_key}")
+    # utf8 byte order matches str (code point) order, the joined bytes are identical to encoding the joined str
+    unique_key = md5(b".".join(sorted(str(v).encode("utf8") for v in values))).hexdigest()
+    # the md5 hexdigest is URL-safe, only the (cached) prefix needs quoting
+    hash_url = _quoted_request_id_url_prefix(uuid_namespace_dns_name) + unique_key
     value = str(uuid5(namespace=NAMESPACE_URL, name=hash_url))
     return value
 
 
 def serialize_json_and_chunk_by_bytes(items: List[Union[dict, str]], max_bytes: int = 2048) -> Generator[str, None, None]:
     """
-    Serialize items into JSON and yield by the resulting
+    Serialize items into JSON lists, yielding the JSON of consecutive items whose utf8 encoded size is <= max_bytes
+
+    Each item is serialized once (see `json_dumps_bytes()`), the size of a chunk is tracked as items are added.
+    ValueError is raised if a single item exceeds max_bytes.
     """
-    is_initial = True
-    last_json_str = None
-    chunked_items = []
     logger.debug(f"chunk_processing items incoming: {len(items)}")
+    chunk = []
+    chunk_bytes = 2  # "[]"
     for item in items:
-        if chunked_items:
-            json_str = json.dumps(chunked_items)
-            json_bytes = json_str.encode("utf8")
-
-            if is_initial and len(json_bytes) > max_bytes:
-                raise ValueError(f"Single item > max_bytes({max_bytes}: {json_bytes}")
-
-            elif len(json_bytes) > max_bytes:
-                yield last_json_str
-                chunked_items = chunked_items[-1:]  # remove items yielded in last_json_str
-
-            last_json_str = json_str
-        chunked_items.append(item)
-        is_initial = False
-
-    if chunked_items:
-        json_str = json.dumps(chunked_items)
-        encoded = json_str.encode("utf8")
-        if len(encoded) >= max_bytes:
-            json_str = json.dumps(chunked_items[:-1])
-            yield json_str  # make sure to send last one!
-            json_str = json.dumps(chunked_items[-1:])
-            yield json_str  # make sure to send last one!
-        else:
-            yield json_str  # make sure to send last one!
-
-
-def requests_retry_session(retries=3, backoff_factor=0.3, status_forcelist=(500, 502, 504), session=None):
+        item_json_bytes = json_dumps_bytes(item)
+        if 2 + len(item_json_bytes) > max_bytes:
+            raise ValueError(f"Single item > max_bytes({max_bytes}): {item_json_bytes}")
+        # items are separated by ","
+        added_bytes = len(item_json_bytes) + 1 if chunk else len(item_json_bytes)
+        if chunk_bytes + added_bytes > max_bytes:
+            yield (b"[" + b",".join(chunk) + b"]").decode("utf8")
+            chunk = []
+            chunk_bytes = 2
+            added_bytes = len(item_json_bytes)
+        chunk.append(item_json_bytes)
+        chunk_bytes += added_bytes
+    if chunk:
+        yield (b"[" + b",".join(chunk) + b"]").decode("utf8")  # make sure to send last one!
+
+
+def requests_retry_session(retries=3, backoff_factor=0.3, status_forcelist=(500, 502, 504), session=None, pool_connections=10, pool_maxsize=10):
     """
     request retry sessions
     :param retries:
     :param backoff_factor:
     :param status_forcelist:
     :param session:
+    :param pool_connections: number of connection pools (hosts) cached
+    :param pool_maxsize: maximum number of connections kept per pool
     :return:
     """
     session = session or requests.Session()
     retry = Retry(total=retries, read=retries, connect=retries, backoff_factor=backoff_factor, status_forcelist=status_forcelist)
-    adapter = HTTPAdapter(max_retries=retry)
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_connections, pool_maxsize=pool_maxsize)
     session.mount("http://", adapter)
     session.mount("https://", adapter)
     return session
@@ -309,7 +682,7 @@ def s3_key_exists(bucket: str, key: str) -> bool:
     """Check if given bucket, key exists"""
     exists = False
     try:
-        S3.head_object(Bucket=bucket, Key=key)
+        get_s3_client().head_object(Bucket=bucket, Key=key)
         exists = True
     except ClientError as e:
         if e.response["ResponseMetadata"]["HTTPStatusCode"] == 404:
@@ -6,8 +6,10 @@ from decimal import Decimal
 from pathlib import Path
 
 import boto3
+import numpy
 from igata import settings
-from igata.handlers.aws.output.dynamodb import DynamodbOutputCtxManager, prepare_record
+from igata.handlers.aws.output.dynamodb import DynamodbOutputCtxManager, ResultExpectedKeyError, prepare_record
+from igata.handlers.aws.output.utils import check_and_convert
 from tests.utils import _dynamodb_create_table, _dynamodb_delete_table, _get_dynamodb_table_resource
 
 # add test root to PATH in order to load dummypredictor
@@ -114,7 +116,7 @@ def test_output_handler_dynamodboutputctxmanager():
         assert result_item
         assert "state" in result_item
         assert result_item["state"] == settings.DYNAMODB_RESULTS_PROCESSED_STATE
-        assert result_item["result"] == result_json
+        assert json.loads(result_item["result"]) == json.loads(result_json)
         assert "collection_id" in result_item
         assert result_item["collection_id"] == collection_id
 
@@ -192,7 +194,7 @@ def test_output_handler_dynamodboutputctxmanager_put_record():
         assert result_item
         assert "state" in result_item
         assert result_item["state"] == settings.DYNAMODB_RESULTS_PROCESSED_STATE
-        assert result_item["result"] == result_json
+        assert json.loads(result_item["result"]) == json.loads(result_json)
         assert "collection_id" in result_item
         assert result_item["collection_id"] == collection_id
 
@@ -206,13 +208,17 @@ def test_output_handler_dynamodboutputctxmanager_put_record():
 def test_output_handler_dynamodboutputctxmanager_prepare_record():
     result = [{"a": 1, "b": "other"}]
     result_json = json.dumps(result)
-    record = {"first": 123, "second": "2nd", "result": result}
+    record = {"first": 123, "second": "2nd", "score": 0.5, "result": result}
     prepared_record, original_nested = prepare_record(record)
 
+    # check that non-nested float values are converted to Decimal
+    assert prepared_record["score"] == Decimal("0.5")
+    assert isinstance(prepared_record["score"], Decimal)
+
     assert "result" in original_nested
 
     # check that nested record was converted to json
-    assert prepared_record["result"] == result_json
+    assert json.loads(prepared_record["result"]) == json.loads(result_json)
 
     # check that all keys exist in prepared_record
     assert all(original_key in prepared_record for original_key in record.keys())
@@ -220,6 +226,31 @@ def test_output_handler_dynamodboutputctxmanager_prepare_record():
     # check that non-nested keys are NOT included in original_nested
     assert "first" not in original_nested
     assert "second" not in original_nested
+    assert "score" not in original_nested
+
+
+def test_output_handler_dynamodboutputctxmanager_check_and_convert():
+    precision = settings.DYNAMODB_DECIMAL_PRECISION_DIGITS
+    for value in (0.77, 0.1, 1 / 3, -0.0000005, 2.5e-7, 1e20, 123456.789, 0.0, -0.0):
+        expected = round(Decimal(value), precision)
+        actual = check_and_convert(value)
+        assert isinstance(actual, Decimal)
+        assert actual == expected and str(actual) == str(expected), f"actual({actual}) != expected({expected})"
+        # non-default precision
+        assert check_and_convert(value, precision=2) == round(Decimal(value), 2)
+
+    # the sign of zero values is kept independent of the conversion order
+    for value in (0.0, -0.0, 0.0):
+        record, _ = prepare_record({"score": value, "result": []})
+        assert str(record["score"]) == str(round(Decimal(value), precision))
+
+    # float subclasses are converted
+    record, _ = prepare_record({"score": numpy.float64(0.5), "result": []})
+    assert isinstance(record["score"], Decimal)
+
+    # non-float values are returned as-is
+    for value in (1, "1.5", True, None, Decimal("0.5")):
+        assert check_and_convert(value) is value
 
 
 def test_output_handler_dynamodboutputctxmanager_duplicate_record_overwrite():
@@ -354,3 +385,37 @@ def test_output_handler_dynamodboutputctxmanager_duplicate_record_overwrite():
     finally:
         _dynamodb_delete_table(requests_tablename)
         _dynamodb_delete_table(results_tablename)
+
+
+def test_output_handler_dynamodboutputctxmanager_invalid_record():
+    requests_tablename = "txessutsasitsassdsxz-srequests"
+    results_tablename = "texsstisissdsdsstxz-sresults"
+    requests_fields = {"request_id": ("S", "HASH")}
+    results_fields = {"hashkey": ("S", "HASH"), "s3_uri": ("S", "RANGE")}
+    now = datetime.datetime.now()
+    try:
+        request_table = _dynamodb_create_table(requests_tablename, requests_fields)
+        results_table = _dynamodb_create_table(results_tablename, results_fields)
+        request_table.put_item(Item={"request_id": "rid1", "state": "queued", "result": None})
+        result = [{"detection_score": 0.77, "is_valid": False}]
+        valid_item = {"s3_uri": "s3://bucket/key1", "request_id": "rid1", "created_at_timestamp": int(now.timestamp()), "result": result}
+        # missing the "s3_uri" additional parent key
+        invalid_item = {"request_id": "rid2", "created_at_timestamp": int(now.timestamp()), "result": result}
+
+        output_settings = {"results_tablename": results_tablename, "requests_tablename": requests_tablename}
+        with DynamodbOutputCtxManager(**output_settings) as dynamodb:
+            try:
+                dynamodb.put_records([valid_item, invalid_item])
+                raise AssertionError("expected ResultExpectedKeyError")
+            except ResultExpectedKeyError:
+                pass
+
+        # records prepared before the invalid record *must* still be written
+        request_item = request_table.get_item(Key={"request_id": "rid1"})["Item"]
+        assert request_item["state"] == settings.DYNAMODB_RESULTS_PROCESSED_STATE
+        detailed_items = results_table.scan()["Items"]
+        assert len(detailed_items) == 1
+        assert detailed_items[0]["s3_uri"] == "s3://bucket/key1"
+    finally:
+        _dynamodb_delete_table(requests_tablename)
+        _dynamodb_delete_table(results_tablename)
@@ -1,14 +1,18 @@
 import gzip
 import logging
 import sys
+from io import BytesIO
 from pathlib import Path
 from uuid import uuid4
 
 import boto3
+import igata.handlers.aws.output.s3
 import pandas
+import pytest
 from igata import settings
 from igata.handlers import OUTPUT_CONTEXT_MANAGER_REQUIRED_ENVARS
-from igata.handlers.aws.output.s3 import S3BucketPandasDataFrameCsvFileOutputCtxManager
+from igata.handlers.aws.output.s3 import DataFrameCsvStream, S3BucketPandasDataFrameCsvFileOutputCtxManager, is_pyarrow_csv_supported, write_pyarrow_csv
+from igata.handlers.aws.output.utils import UPDATE_ITEM_EXPRESSION_ATTRIBUTE_NAMES, prepare_request_item
 from tests.utils import setup_teardown_dyanmodb_table, setup_teardown_s3_bucket
 
 # add test root to PATH in order to load dummypredictor
@@ -88,6 +92,75 @@ def test_output_handler_s3bucketpandasdataframecsvfileoutputctxmanager_required_
         assert expected_envar in OUTPUT_CONTEXT_MANAGER_REQUIRED_ENVARS[str(mgr)]
 
 
+def test_output_handler_s3_dataframecsvstream():
+    sample_df = create_sample_dataframe()
+    for kwargs in (
+        {"header": True, "index": False},
+        {"header": None, "index": False, "compression": {"method": "gzip", "compresslevel": 1}},
+        {"header": True, "index": False, "encoding": "utf-8-sig"},  # BOM *must* only be written once
+        {"header": True, "index": False, "encoding": "utf-16"},
+    ):
+        encoding = kwargs.get("encoding", "utf8")
+        expected = sample_df.to_csv(**{k: v for k, v in kwargs.items() if k not in ("compression", "encoding")}).encode(encoding)
+        stream = DataFrameCsvStream(sample_df, kwargs, chunksize=2)  # force multiple chunks
+        actual = stream.read()
+        if "compression" in kwargs:
+            actual = gzip.decompress(actual)
+        assert actual == expected, f"actual({actual}) != expected({expected})"
+
+
+def test_output_handler_s3_write_pyarrow_csv():
+    pytest.importorskip("pyarrow")
+    sample_df = create_sample_dataframe()
+    for kwargs in ({"header": True, "index": False}, {"header": None, "index": False, "compression": {"method": "gzip", "compresslevel": 1}}):
+        assert is_pyarrow_csv_supported(kwargs)
+        buffer = BytesIO()
+        write_pyarrow_csv(sample_df, buffer, kwargs)
+        actual = buffer.getvalue()
+        if "compression" in kwargs:
+            actual = gzip.decompress(actual)
+        expected_lines = len(sample_df) + (1 if kwargs["header"] else 0)
+        assert len(actual.decode("utf8").strip().split("\n")) == expected_lines
+    assert not is_pyarrow_csv_supported({"header": True, "index": False, "encoding": "utf-16"})
+
+
+def test_output_handler_s3_prepare_request_item():
+    item = {
+        settings.DYNAMODB_REQUESTS_TABLE_HASHKEY_KEYNAME: "request-1",
+        settings.DYNAMODB_RESULTS_TABLE_STATE_FIELDNAME: "completed",
+        "result_s3_uris": "[]",
+        "errors": None,
+        "updated_timestamp": None,
+        "completed_timestamp": 1,
+    }
+    request_item = prepare_request_item(item)
+    # overwritten items *must* contain the same attributes set by update_item()
+    expected_keys = {settings.DYNAMODB_REQUESTS_TABLE_HASHKEY_KEYNAME} | set(UPDATE_ITEM_EXPRESSION_ATTRIBUTE_NAMES.values())
+    assert set(request_item.keys()) == expected_keys
+    assert request_item["errors"] == "[]"
+    assert isinstance(request_item["updated_timestamp"], int)
+    assert request_item["completed_timestamp"] == 1
+
+
+@setup_teardown_s3_bucket(bucket=TEST_OUTPUT_BUCKETNAME)
+def test_output_handler_s3bucketpandasdataframecsvfileoutputctxmanager__with_file_upload():
+    sample_df = create_sample_dataframe()
+    record = {"job_id": str(uuid4()), "filename": "outputfilename.csv", "dataframe": sample_df, "is_valid": True}
+    output_settings = {"output_s3_bucket": TEST_OUTPUT_BUCKETNAME, "results_keyname": "result", "output_s3_prefix": "prefix/"}
+    original_min_bytes = igata.handlers.aws.output.s3.S3BUCKET_OUTPUT_FILE_UPLOAD_MIN_BYTES
+    igata.handlers.aws.output.s3.S3BUCKET_OUTPUT_FILE_UPLOAD_MIN_BYTES = 0  # force upload from a named temporary file
+    try:
+        with S3BucketPandasDataFrameCsvFileOutputCtxManager(**output_settings) as pandascsvoutputmgr:
+            output_info = pandascsvoutputmgr.put_record(record)
+    finally:
+        igata.handlers.aws.output.s3.S3BUCKET_OUTPUT_FILE_UPLOAD_MIN_BYTES = original_min_bytes
+
+    response = S3.get_object(**output_info)
+    assert response["ResponseMetadata"]["HTTPStatusCode"] == 200
+    assert response["ContentType"] == "text/csv"
+    assert response["Body"].read().decode("utf8") == sample_df.to_csv(header=None, index=False)
+
+
 @setup_teardown_s3_bucket(bucket=TEST_OUTPUT_BUCKETNAME)
 def test_output_handler_s3bucketpandasdataframecsvfileoutputctxmanager__with_gzip_compression():
     job_id = str(uuid4())
@@ -145,6 +218,58 @@ def test_output_handler_s3bucketpandasdataframecsvfileoutputctxmanager__with_for
         # check that file(s) in bucket
         response = S3.get_object(**output_info)
         assert response["ResponseMetadata"]["HTTPStatusCode"] == 200
+        assert response["ContentType"] == "application/gzip"
         data = gzip.decompress(response["Body"].read())
         lines = data.decode("utf8").strip().split("\n")
         assert len(lines) == 5, lines
+
+
+@setup_teardown_s3_bucket(bucket=TEST_OUTPUT_BUCKETNAME)
+@setup_teardown_dyanmodb_table(tablename="test_requests_table", fields={"job_id": ("S", "HASH")})
+def test_output_handler_s3bucketpandasdataframecsvfileoutputctxmanager__with_overwrite_requests(*args, **kwargs):
+    job_id = str(uuid4())
+    sample_df = create_sample_dataframe()
+    record = {"job_id": job_id, "filename": "outputfilename.csv", "dataframe": sample_df, "is_valid": True}
+
+    table = kwargs.get("dynamodb_table")
+    table.put_item(Item={"job_id": job_id, "predictor_status": "pending", "result_s3_uris": "[]", "errors": "[]"})
+
+    output_settings = {
+        "output_s3_bucket": TEST_OUTPUT_BUCKETNAME,
+        "results_keyname": "result_s3_uris",
+        "output_s3_prefix": "prefix/",
+        "overwrite_requests": True,
+    }
+    with S3BucketPandasDataFrameCsvFileOutputCtxManager(**output_settings) as pandascsvoutputmgr:
+        output_info = pandascsvoutputmgr.put_record(record)
+
+    response = table.get_item(Key={"job_id": job_id})
+    item = response["Item"]
+    assert item["predictor_status"] == settings.DYNAMODB_RESULTS_PROCESSED_STATE
+    expected_s3_uri = f"s3://{output_info['Bucket']}/{output_info['Key']}"
+    assert expected_s3_uri in item["result_s3_uris"]
+    assert item["errors"] == "[]"
+    assert "updated_timestamp" in item and "completed_timestamp" in item
+
+
+@setup_teardown_dyanmodb_table(tablename="test_requests_table", fields={"job_id": ("S", "HASH")})
+def test_output_handler_s3bucketpandasdataframecsvfileoutputctxmanager__upload_error(*args, **kwargs):
+    job_id = str(uuid4())
+    sample_df = create_sample_dataframe()
+    record = {"job_id": job_id, "filename": "outputfilename.csv", "dataframe": sample_df, "is_valid": True}
+
+    table = kwargs.get("dynamodb_table")
+    table.put_item(Item={"job_id": job_id, "predictor_status": "pending", "result_s3_uris": "[]", "errors": "[]"})
+
+    # output bucket is NOT created, upload is expected to fail
+    output_settings = {"output_s3_bucket": "test-output-bucket-doesnotexist", "results_keyname": "result_s3_uris", "output_s3_prefix": "prefix/"}
+    with S3BucketPandasDataFrameCsvFileOutputCtxManager(**output_settings) as pandascsvoutputmgr:
+        pandascsvoutputmgr.put_record(record)
+
+    assert record["errors"]
+    assert record["result_s3_uris"] == "[]"
+
+    response = table.get_item(Key={"job_id": job_id})
+    item = response["Item"]
+    assert item["predictor_status"] == settings.DYNAMODB_RESULTS_ERROR_STATE
+    assert item["result_s3_uris"] == "[]"
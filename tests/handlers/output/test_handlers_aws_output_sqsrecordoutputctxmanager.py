@@ -5,7 +5,7 @@ from pathlib import Path
 import boto3
 from igata import settings
 from igata.handlers import OUTPUT_CONTEXT_MANAGER_REQUIRED_ENVARS
-from igata.handlers.aws.output.sqs import SQSRecordOutputCtxManager
+from igata.handlers.aws.output.sqs import SQS_SEND_MESSAGE_BATCH_MAX_BYTES, SQSRecordOutputCtxManager, batch_entries
 from tests.utils import _get_queue_url, setup_teardown_sqs_queue
 
 # add test root to PATH in order to load dummypredictor
@@ -63,3 +63,32 @@ def test_output_handler_sqsrecordoutputctxmanager_required_envars():
     expected_envars = [f"OUTPUT_CTXMGR_{e.upper()}" for e in SQSRecordOutputCtxManager.required_kwargs()]
     for expected_envar in expected_envars:
         assert expected_envar in OUTPUT_CONTEXT_MANAGER_REQUIRED_ENVARS[str(mgr)]
+
+
+@setup_teardown_sqs_queue(queue_name=TEST_SQS_OUTPUT_QUEUENAME)
+def test_output_handler_sqsrecordoutputctxmanager_multiple_batches():
+    records = [{"index": i} for i in range(25)]
+    queue_url = _get_queue_url(TEST_SQS_OUTPUT_QUEUENAME)
+    output_settings = {"sqs_queue_url": queue_url}
+    with SQSRecordOutputCtxManager(**output_settings) as sqs_output:
+        summary = sqs_output.put_records(records)
+        assert summary["sent_messages"] == 25
+        assert summary["failed_messages"] == 0
+
+
+@setup_teardown_sqs_queue(queue_name=TEST_SQS_OUTPUT_QUEUENAME)
+def test_output_handler_sqsrecordoutputctxmanager_large_messages():
+    # each message is below the single message limit, but 10 messages exceed the batch payload limit
+    records = [{"index": i, "value": "x" * (SQS_SEND_MESSAGE_BATCH_MAX_BYTES // 4)} for i in range(10)]
+    batches = list(batch_entries(records, SQSRecordOutputCtxManager.prepare_message_body))
+    assert len(batches) > 1
+    assert sum(len(entries) for entries in batches) == len(records)
+    for entries in batches:
+        assert sum(len(entry["MessageBody"].encode("utf8")) for entry in entries) <= SQS_SEND_MESSAGE_BATCH_MAX_BYTES
+
+    queue_url = _get_queue_url(TEST_SQS_OUTPUT_QUEUENAME)
+    output_settings = {"sqs_queue_url": queue_url}
+    with SQSRecordOutputCtxManager(**output_settings) as sqs_output:
+        summary = sqs_output.put_records(records)
+        assert summary["sent_messages"] == 10
+        assert summary["failed_messages"] == 0
@@ -2,9 +2,12 @@ import json
 import logging
 import sys
 from pathlib import Path
+from threading import Thread, current_thread
 from time import sleep
 from typing import Dict, List, Tuple
 
+import pytest
+
 from .dummypredictor.predictors import (
     DummyInPandasDataFrameOutPandasCSVPredictor,
     DummyPredictorNoInputNoOutput,
@@ -14,13 +17,14 @@ from .dummypredictor.predictors import (
     DummyPredictorOptionalValidStaticMethods,
 )
 from igata.cli import execute_prediction
+from igata.exceptions import PredictTimeoutError
 from igata.handlers.aws.input import InputCtxManagerBase
 from igata.handlers.aws.input.s3 import S3BucketImageInputCtxManager
 from igata.handlers.aws.input.sqs import SQSMessageS3InputImageCtxManager
 from igata.handlers.aws.output import OutputCtxManagerBase
 from igata.handlers.aws.output.dynamodb import DynamodbOutputCtxManager
 from igata.handlers.aws.output.sqs import SQSRecordOutputCtxManager
-from igata.runners.executors import PredictionExecutor
+from igata.runners.executors import SNS_PUBLISH_BATCH_MAX_BYTES, SNS_PUBLISH_BATCH_MAX_ENTRIES, PredictionExecutor, PutRecordWorker, prefetch_records
 
 from .utils import (
     _create_sns_topic,
@@ -229,6 +233,35 @@ def test_executor_requests_with_invalid_sns():
         _dynamodb_delete_table(results_tablename)
 
 
+def test_executor__handle_sns_notifications():
+    request_ids = [f"r-{i:05}" for i in range(10)]
+    published_message_count = PredictionExecutor._handle_sns_notifications({TEST_SNS_TOPIC_ARN: request_ids})
+    assert published_message_count == 1
+
+    # invalid topic is logged, not raised
+    published_message_count = PredictionExecutor._handle_sns_notifications({TEST_SNS_TOPIC_ARN + "invalid": request_ids})
+    assert published_message_count == 0
+
+    # topics are published independently
+    notifications = {TEST_SNS_TOPIC_ARN: request_ids, TEST_SNS_TOPIC_ARN + "invalid": request_ids}
+    published_message_count = PredictionExecutor._handle_sns_notifications(notifications)
+    assert published_message_count == 1
+
+
+def test_executor__prepare_sns_publish_batch_entries():
+    request_ids = [f"r-{i:05}-" + "x" * 1000 for i in range(1000)]
+    batches = list(PredictionExecutor._prepare_sns_publish_batch_entries(request_ids))
+    assert len(batches) > 1
+    published_request_ids = []
+    for entries in batches:
+        assert len(entries) <= SNS_PUBLISH_BATCH_MAX_ENTRIES
+        assert sum(len(entry["Message"].encode("utf8")) for entry in entries) <= SNS_PUBLISH_BATCH_MAX_BYTES
+        assert len({entry["Id"] for entry in entries}) == len(entries)
+        for entry in entries:
+            published_request_ids.extend(json.loads(json.loads(entry["Message"])["default"]))
+    assert published_request_ids == request_ids
+
+
 @setup_teardown_s3_file(local_filepath=TEST_IMAGE_FILEPATH, bucket=TEST_BUCKETNAME, key=TEST_IMAGE_FILENAME)
 @setup_teardown_sqs_queue(queue_name=TEST_SQS_INPUT_QUEUENAME)
 def test_executor_requests_with_meta():
@@ -415,6 +448,96 @@ def test_executor_predictor_with__set_predict_timeout():
     assert execute_summary["errors"] == 1
 
 
+def test_prefetch_records():
+    records = [(i, {"index": i}) for i in range(10)]
+    assert list(prefetch_records(iter(records), maxsize=2)) == records
+
+
+def test_prefetch_records_exception():
+    def get_records():
+        yield 1, {}
+        raise ValueError("download failed")
+
+    results = []
+    with pytest.raises(ValueError):
+        for record in prefetch_records(get_records(), maxsize=2):
+            results.append(record)
+    assert results == [(1, {})]
+
+
+def test_prefetch_records_consumer_stopped():
+    closed = []
+
+    def get_records():
+        try:
+            for i in range(100):
+                yield i, {}
+        finally:
+            closed.append(True)
+
+    records = prefetch_records(get_records(), maxsize=2)
+    assert next(records) == (0, {})
+    records.close()
+    assert closed == [True]
+
+
+@pytest.mark.parametrize("background", [False, True])
+def test_putrecordworker(background):
+    put_records = []
+    hook_calls = []
+
+    def put_record(record_results):
+        put_records.append((record_results, current_thread()))
+        return len(put_records)
+
+    def post_predict_hook(record, response, meta):
+        hook_calls.append((record, response, meta["request_info"]))
+
+    meta = {"request_info": None}
+    with PutRecordWorker(put_record, post_predict_hook, background=background, queue_size=2) as worker:
+        for i in range(5):
+            meta["request_info"] = {"index": i}
+            worker.submit(f"record-{i}", {"result": i}, meta)
+
+    assert [record_results for record_results, _ in put_records] == [{"result": i} for i in range(5)]
+    assert all((thread is current_thread()) is not background for _, thread in put_records)
+    assert hook_calls == [(f"record-{i}", i + 1, {"index": i}) for i in range(5)]
+    assert worker.total_put_duration > 0
+
+
+def test_putrecordworker_background_exception():
+    def put_record(record_results):
+        if record_results["result"] == 1:
+            raise ValueError("put_record failed")
+
+    with pytest.raises(ValueError):
+        with PutRecordWorker(put_record, lambda *args: None, background=True) as worker:
+            for i in range(5):
+                worker.submit(f"record-{i}", {"result": i}, {})
+
+
+def test_predictor_set_predict_timeout__outside_main_thread():
+    predictor = DummyPredictorNoInputNoOutput()
+    errors = []
+
+    def run_predict():
+        predictor.set_predict_timeout(0)
+        sleep(0.01)
+        try:
+            predictor.check_predict_timeout()
+        except PredictTimeoutError as e:
+            errors.append(e)
+        predictor.set_predict_timeout(10)
+        predictor.cancel_predict_timeout()
+        predictor.check_predict_timeout()
+
+    thread = Thread(target=run_predict)
+    thread.start()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert len(errors) == 1
+
+
 @setup_teardown_s3_file(local_filepath=TEST_IMAGE_FILEPATH, bucket=TEST_BUCKETNAME, key=TEST_IMAGE_FILENAME)
 @setup_teardown_sqs_queue(queue_name=TEST_SQS_OUTPUT_QUEUENAME)
 def test_executor_predictor_with_outputctxmgrmixin():
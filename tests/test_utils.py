@@ -1,10 +1,28 @@
+import csv
+import datetime
+import gzip
+import json
+import sys
+from decimal import Decimal
+from io import BytesIO, StringIO
 from pathlib import Path
+from threading import Thread
+from time import sleep
 from uuid import UUID
 
+import numpy
 import pandas
 import pytest
-from igata import settings
-from igata.utils import flatten, generate_request_id, prepare_csv_dataframe, prepare_csv_reader
+from igata import settings, utils
+from igata.utils import (
+    download_starmap,
+    flatten,
+    generate_request_id,
+    json_dumps,
+    prepare_csv_dataframe,
+    prepare_csv_reader,
+    serialize_json_and_chunk_by_bytes,
+)
 
 from .utils import setup_teardown_s3_file
 
@@ -24,6 +42,10 @@ def test_generate_request_id():
     except ValueError:
         raise pytest.fail(f"result is not a valid UUID: {result}")
 
+    # generated ids are persisted, confirm the value is stable
+    assert generate_request_id(*hashable_values, uuid_namespace_dns_name="my-api.com") == "7a16c3ed-2b79-5bec-9e58-6beef8ac96d7"
+    assert generate_request_id(999, "somevalue", uuid_namespace_dns_name="my-api.com") == "7a16c3ed-2b79-5bec-9e58-6beef8ac96d7"
+
     exception_raised = True
     with pytest.raises(ValueError) as verror:
         nonhashable_values = ({"k": [1, 2, 3]}, 1, "other")
@@ -41,6 +63,138 @@ def test_flatten():
     assert actual == expected, f"actual({actual}) != expected({expected})"
 
 
+def test_flatten_order():
+    nested_dict = {"a": [{"b": 1, "c": ""}, {"b": 2}], "": {"d": [3, [4]]}, 5: None}
+    expected = [("a__b", 1), ("a__c", ""), ("a__b", 2), ("d", 3), ("d", 4), ("5", None)]
+    assert list(flatten(nested_dict)) == expected
+    assert list(flatten(nested_dict, allow_null_strings=False)) == [pair for pair in expected if pair[1] != ""]
+    assert list(flatten(nested_dict["a"], keystring="x", separator=".")) == [("x.b", 1), ("x.c", ""), ("x.b", 2)]
+
+    # nesting depth is not limited by the recursion limit
+    deeply_nested = value = {}
+    for _ in range(sys.getrecursionlimit() * 2):
+        value["k"] = {}
+        value = value["k"]
+    value["k"] = 1
+    ((key, value),) = flatten(deeply_nested)
+    assert value == 1
+
+
+SAMPLE_IMAGE_FILEPATH = Path(__file__).parent / "data" / "images" / "pacioli-512x512.png"
+
+
+@setup_teardown_s3_file(SAMPLE_IMAGE_FILEPATH, bucket="igata-testbucket-localstack", key=SAMPLE_IMAGE_FILEPATH.name)
+def test_prepare_images():
+    import imageio
+
+    _, image, download_time, error_message = utils.prepare_images(bucket="igata-testbucket-localstack", key=SAMPLE_IMAGE_FILEPATH.name)
+    assert error_message is None
+    # RGBA input is returned as contiguous RGB
+    assert image.shape == (512, 512, 3)
+    assert image.flags["C_CONTIGUOUS"]
+    assert numpy.array_equal(image, imageio.imread(SAMPLE_IMAGE_FILEPATH)[:, :, :3])
+
+
+@setup_teardown_s3_file(SAMPLE_IMAGE_FILEPATH, bucket="igata-testbucket-localstack", key=SAMPLE_IMAGE_FILEPATH.name)
+def test_prepare_images_cv2():
+    pytest.importorskip("cv2")
+    import imageio
+
+    _, image, download_time, error_message = utils.prepare_images(bucket="igata-testbucket-localstack", key=SAMPLE_IMAGE_FILEPATH.name)
+    assert error_message is None
+    expected = imageio.imread(SAMPLE_IMAGE_FILEPATH)[:, :, :3]
+    assert numpy.array_equal(image, expected)
+
+
+@setup_teardown_s3_file(SAMPLE_IMAGE_FILEPATH, bucket="igata-testbucket-localstack", key=SAMPLE_IMAGE_FILEPATH.name)
+def test_prepare_images_batch():
+    bucket_keys = [("igata-testbucket-localstack", SAMPLE_IMAGE_FILEPATH.name)] * 2
+    keys, images, download_times, error_messages = utils.prepare_images_batch(bucket_keys)
+    assert keys == bucket_keys
+    assert images.shape == (2, 512, 512, 3)
+    assert download_times.shape == (2,)
+    assert error_messages == [None, None]
+
+    # ragged (failed download) results are returned as an object array
+    keys, images, download_times, error_messages = utils.prepare_images_batch(bucket_keys + [("igata-testbucket-localstack", "missing.png")])
+    assert images.dtype == object
+    assert images.shape == (3,)
+    assert images[0].shape == (512, 512, 3)
+    assert error_messages[:2] == [None, None]
+    assert error_messages[2]
+
+
+def test_get_presigned_get_object_url():
+    url = utils.get_presigned_get_object_url("igata-testbucket-localstack", "some/key.csv")
+    assert "some/key.csv" in url
+    assert utils.get_presigned_get_object_url("igata-testbucket-localstack", "some/key.csv") == url
+    assert utils.get_presigned_get_object_url("igata-testbucket-localstack", "other/key.csv") != url
+
+
+def test_download_starmap():
+    def delayed_add(a, b):
+        sleep(0.01 * ((a * 7) % 5))  # complete out of order
+        return a + b
+
+    args = [(i, 1) for i in range(20)]
+    assert list(download_starmap(delayed_add, args)) == [i + 1 for i in range(20)]
+    assert list(download_starmap(delayed_add, args, window=1)) == [i + 1 for i in range(20)]
+    assert list(download_starmap(delayed_add, [])) == []
+
+
+@pytest.mark.parametrize("max_bytes", [17, 20, 64, 2048])
+def test_serialize_json_and_chunk_by_bytes(max_bytes):
+    items = ["x" * 8, "y" * 8, "z" * 8, "w" * 8, "a", "b", "c", "日本語", {"key": "value"}]
+    chunks = list(serialize_json_and_chunk_by_bytes(items, max_bytes=max_bytes))
+    assert all(len(chunk.encode("utf8")) <= max_bytes for chunk in chunks)
+    assert [item for chunk in chunks for item in json.loads(chunk)] == items
+
+    with pytest.raises(ValueError):
+        list(serialize_json_and_chunk_by_bytes(["x" * max_bytes], max_bytes=max_bytes))
+
+
+def test_json_dumps():
+    obj = {"a": 1, "b": [0.5, "other"], "c": Decimal("0.25"), "d": datetime.datetime(2020, 1, 2, 3, 4, 5)}
+    expected = {"a": 1, "b": [0.5, "other"], "c": 0.25, "d": "2020-01-02T03:04:05"}
+    actual = json_dumps(obj)
+    assert isinstance(actual, str)
+    assert json.loads(actual) == expected, f"actual({actual}) != expected({expected})"
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_json_dumps_output_format(monkeypatch, use_orjson):
+    # stored JSON *must* be the same with or without the optional orjson package installed
+    if use_orjson and utils.orjson is None:
+        pytest.skip("orjson not installed")
+    if not use_orjson:
+        monkeypatch.setattr(utils, "orjson", None)
+    obj = {"a": float("nan"), "b": [1, float("inf")], "c": "あ", "d": Decimal("0.5"), "e": numpy.array([1.5, numpy.nan])}
+    expected = '{"a":null,"b":[1,null],"c":"あ","d":0.5,"e":[1.5,null]}'
+    actual = json_dumps(obj)
+    assert actual == expected, f"actual({actual}) != expected({expected})"
+
+
+def test_get_dynamodb_table():
+    # start from an empty client cache, the resource must be created while creating the table
+    utils._AWS_CLIENTS.clear()
+    tables = []
+    thread = Thread(target=lambda: tables.append(utils.get_dynamodb_table("test-table")), daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive(), "get_dynamodb_table() did not return"
+    table = tables[0]
+    assert table.name == "test-table"
+    assert utils.get_dynamodb_table("test-table") is table
+    assert utils.get_dynamodb_table("other-table") is not table
+
+
+def test_get_sqs_client():
+    client = utils.get_sqs_client()
+    assert utils.get_sqs_client() is client
+    assert utils.get_sqs_client(region_name="ap-northeast-1") is not client
+    assert utils.get_aws_session() is utils.get_aws_session()
+
+
 @setup_teardown_s3_file(SAMPLE_CSV_FILEPATH, bucket="igata-testbucket-localstack", key=SAMPLE_CSV_FILEPATH.name)
 def test_prepare_csv_reader_csv():
     _, csvreader, download_time, error_message = prepare_csv_reader(bucket="igata-testbucket-localstack", key=SAMPLE_CSV_FILEPATH.name)
@@ -65,6 +219,26 @@ def test_prepare_csv_reader_csvgz():
     assert second_line == {"a": "4", "b": "5", "c": "6"}
 
 
+@pytest.mark.parametrize("reader", [csv.DictReader, csv.reader])
+@pytest.mark.parametrize("filepath,compression", [(SAMPLE_CSV_FILEPATH, None), (SAMPLE_CSVGZ_FILEPATH, "gzip")])
+def test_iter_csv_rows_pandas(reader, filepath, compression):
+    expected = list(reader(StringIO(SAMPLE_CSV_FILEPATH.read_text())))
+    rows = utils._iter_csv_rows_pandas(BytesIO(filepath.read_bytes()), reader, "utf8", ",", compression)
+    assert list(rows) == expected
+
+
+@pytest.mark.parametrize("reader", [csv.DictReader, csv.reader])
+@pytest.mark.parametrize("filepath", [SAMPLE_CSV_FILEPATH, SAMPLE_CSVGZ_FILEPATH])
+def test_iter_csv_rows_pyarrow(reader, filepath):
+    pytest.importorskip("pyarrow")
+    expected = list(reader(StringIO(SAMPLE_CSV_FILEPATH.read_text())))
+    fileobj = BytesIO(filepath.read_bytes())
+    if filepath.suffix == ".gz":
+        fileobj = gzip.GzipFile(fileobj=fileobj)
+    rows = utils._iter_csv_rows_pyarrow(fileobj, reader, "utf8", ",")
+    assert list(rows) == expected
+
+
 @setup_teardown_s3_file(SAMPLE_CSV_FILEPATH, bucket="igata-testbucket-localstack", key="badext.zip")
 def test_prepare_csv_reader_invalidext():
     _, csvreader, download_time, error_message = prepare_csv_reader(bucket="igata-testbucket-localstack", key=SAMPLE_CSVGZ_FILEPATH.name)
@@ -72,6 +246,12 @@ def test_prepare_csv_reader_invalidext():
     assert error_message
 
 
+def test_prepare_csv_reader_unsupported_extension():
+    _, csvreader, download_time, error_message = prepare_csv_reader(bucket="igata-testbucket-localstack", key="some/file.CSV.zip")
+    assert csvreader is None
+    assert error_message == "unsupported CSV file extension: s3://igata-testbucket-localstack/some/file.CSV.zip"
+
+
 @setup_teardown_s3_file(SAMPLE_CSV_FILEPATH, bucket="igata-testbucket-localstack", key=SAMPLE_CSV_FILEPATH.name)
 def test_prepare_csv_dataframe_csv():
     _, df, download_time, error_message = prepare_csv_dataframe(bucket="igata-testbucket-localstack", key=SAMPLE_CSV_FILEPATH.name)
@@ -99,6 +279,19 @@ def test_prepare_csv_dataframe_csvgz():
     assert pandas.testing.assert_frame_equal(df, expected) is None
 
 
+@setup_teardown_s3_file(SAMPLE_CSVGZ_FILEPATH, bucket="igata-testbucket-localstack", key=SAMPLE_CSVGZ_FILEPATH.name)
+def test_prepare_csv_dataframe_csvgz_read_csv_kwargs():
+    read_csv_kwargs = {"sep": ",", "encoding": "utf8", "header": None}
+    given_read_csv_kwargs = dict(read_csv_kwargs)
+    _, df, download_time, error_message = prepare_csv_dataframe(
+        bucket="igata-testbucket-localstack", key=SAMPLE_CSVGZ_FILEPATH.name, read_csv_kwargs=given_read_csv_kwargs
+    )
+    assert isinstance(df, pandas.DataFrame)
+    assert given_read_csv_kwargs == read_csv_kwargs  # given kwargs are not updated
+    expected = pandas.read_csv(SAMPLE_CSVGZ_FILEPATH, compression="gzip", **read_csv_kwargs)
+    assert pandas.testing.assert_frame_equal(df, expected) is None
+
+
 @setup_teardown_s3_file(SAMPLE_CSVGZ_FILEPATH, bucket="igata-testbucket-localstack", key=SAMPLE_CSVGZ_FILEPATH.name)
 def test_prepare_csv_dataframe_csv_doesnotexist():
     _, df, download_time, error_message = prepare_csv_dataframe(bucket="igata-testbucket-localstack", key=SAMPLE_CSV_FILEPATH.name)